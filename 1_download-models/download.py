@@ -1,11 +1,22 @@
 import utils.constants as const
 from utils.huggingface_utils import (
     cache_and_load_embedding_model,
+    download_gguf_model,
     quantise_and_save_local_model,
+    resolve_local_llm_backend,
 )
+from utils.retriever_utils import get_colbert_model
 
 # This just caches the embedding model for future use
 cache_and_load_embedding_model()
 
-# cache the Llama 3 8b local model in a 4-bit quantised format
-quantise_and_save_local_model()
+if resolve_local_llm_backend() == "llamacpp":
+    # CPU sessions run a GGUF quantised model through llama.cpp instead
+    download_gguf_model()
+else:
+    # cache the Llama 3 8b local model in a 4-bit quantised format, along with its
+    # tokenizer and generation config, so that the app can load it offline
+    quantise_and_save_local_model()
+
+# cache the ColBERT reranking model as well
+get_colbert_model()
@@ -0,0 +1,72 @@
+import argparse
+import time
+
+from dotenv import load_dotenv
+from langchain.graphs import Neo4jGraph
+
+import utils.constants as const
+from utils.data_utils import get_graph_version, stamp_graph_version
+from utils.huggingface_utils import load_local_model
+from utils.neo4j_utils import (
+    get_neo4j_credentails,
+    is_neo4j_server_up,
+    reset_neo4j_server,
+    wait_for_neo4j_server,
+)
+from utils.paper_card_utils import (
+    get_papers_without_card_summary,
+    save_card_summaries,
+    summarize_papers,
+    update_paper_card_links,
+)
+
+parser = argparse.ArgumentParser(
+    description="Precompute the paper cards the follow-up answer is rendered from."
+)
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=const.paper_card_batch_size,
+    help="Number of paper summaries generated per LLM call.",
+)
+parser.add_argument(
+    "--skip-summaries",
+    action="store_true",
+    help="Only refresh the related papers and top authors of the cards.",
+)
+args = parser.parse_args()
+
+load_dotenv()
+
+if not is_neo4j_server_up():
+    reset_neo4j_server()
+    wait_for_neo4j_server()
+
+graph = Neo4jGraph(
+    username=get_neo4j_credentails()["username"],
+    password=get_neo4j_credentails()["password"],
+    url=get_neo4j_credentails()["uri"],
+)
+
+start = time.perf_counter()
+graph_version = get_graph_version(graph) or stamp_graph_version(
+    graph, const.embed_model_name
+)
+updated = update_paper_card_links(graph, graph_version, const.paper_card_top_n)
+print(
+    f"Updated the related papers and top authors of {updated} paper cards in {time.perf_counter() - start:.1f}s"
+)
+
+papers = [] if args.skip_summaries else get_papers_without_card_summary(graph)
+print(f"Paper cards without a summary: {len(papers)}")
+if papers:
+    llm = load_local_model()
+    summarized = 0
+    start = time.perf_counter()
+    # Summaries are saved batch by batch, an interrupted run resumes where it stopped.
+    for rows in summarize_papers(llm, const.llama3_bos_token, papers, args.batch_size):
+        save_card_summaries(graph, rows)
+        summarized += len(rows)
+        print(
+            f"Summarized {summarized}/{len(papers)} papers, {summarized / (time.perf_counter() - start):.2f} papers/s"
+        )
@@ -0,0 +1,117 @@
+import argparse
+import time
+
+from dotenv import load_dotenv
+from langchain.graphs import Neo4jGraph
+
+import utils.constants as const
+from utils.data_utils import (
+    create_chunk_vector_index_query,
+    create_indices_queries,
+    create_vector_index_query,
+    stamp_graph_version,
+)
+from utils.neo4j_utils import (
+    get_neo4j_credentails,
+    is_neo4j_server_up,
+    reset_neo4j_server,
+    wait_for_neo4j_server,
+)
+from utils.snapshot_utils import GraphSnapshot, load_snapshot_manifest
+
+parser = argparse.ArgumentParser(
+    description="Export the knowledge graph to a local snapshot, or restore one into Neo4j."
+)
+subparsers = parser.add_subparsers(dest="command", required=True)
+export_parser = subparsers.add_parser("export")
+export_parser.add_argument("snapshot_dir")
+restore_parser = subparsers.add_parser("restore")
+restore_parser.add_argument("snapshot_dir")
+restore_parser.add_argument(
+    "--force",
+    action="store_true",
+    help="Delete the current contents of the graph before restoring.",
+)
+args = parser.parse_args()
+
+load_dotenv()
+
+if args.command == "restore":
+    manifest = load_snapshot_manifest(args.snapshot_dir)
+    if manifest["embedding_model"] != const.embed_model_name:
+        print(
+            f"The snapshot was embedded with {manifest['embedding_model']}, the application uses {const.embed_model_name}."
+        )
+        raise SystemExit(1)
+
+if not is_neo4j_server_up():
+    reset_neo4j_server()
+    wait_for_neo4j_server()
+
+start = time.perf_counter()
+snapshot = GraphSnapshot(
+    uri=get_neo4j_credentails()["uri"],
+    username=get_neo4j_credentails()["username"],
+    password=get_neo4j_credentails()["password"],
+)
+
+if args.command == "export":
+    with snapshot:
+        manifest = snapshot.export(
+            args.snapshot_dir,
+            embedding_model=const.embed_model_name,
+            compressor_path=const.EMBEDDING_COMPRESSOR_PATH,
+        )
+    print(
+        f"Exported graph version {manifest['graph_version']} to {args.snapshot_dir} in {time.perf_counter() - start:.1f}s"
+    )
+    raise SystemExit(0)
+
+graph = Neo4jGraph(
+    username=get_neo4j_credentails()["username"],
+    password=get_neo4j_credentails()["password"],
+    url=get_neo4j_credentails()["uri"],
+)
+
+with snapshot:
+    if not snapshot.is_graph_empty():
+        if not args.force:
+            print("The graph is not empty, pass --force to replace its contents.")
+            raise SystemExit(1)
+        graph.query(
+            """
+        MATCH (n)
+        CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+        """
+        )
+    snapshot.restore(
+        args.snapshot_dir,
+        compressor_path=const.EMBEDDING_COMPRESSOR_PATH,
+        rows_per_transaction=const.chunk_rows_per_transaction,
+    )
+
+index_start = time.perf_counter()
+for q in create_indices_queries():
+    graph.query(q)
+graph.query(create_chunk_vector_index_query(manifest["chunk_embedding_dimension"]))
+for label, index_name in [
+    ("Category", "category_embedding_index"),
+    ("Paper", "paper_embedding_index"),
+]:
+    dimension = graph.query(
+        f"""
+    MATCH (n:{label}) WHERE n.embedding IS NOT NULL
+    RETURN size(n.embedding) AS dimension LIMIT 1
+    """
+    )
+    if dimension:
+        graph.query(
+            create_vector_index_query(index_name, label, dimension[0]["dimension"])
+        )
+graph.query("CALL db.awaitIndexes(3600)")
+print(f"Created indexes in {time.perf_counter() - index_start:.1f}s")
+
+stamp_graph_version(graph, manifest["embedding_model"], manifest["graph_version"])
+print(
+    f"Restored graph version {manifest['graph_version']} from {args.snapshot_dir} in {time.perf_counter() - start:.1f}s"
+)
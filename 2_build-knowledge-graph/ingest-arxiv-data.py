@@ -1,5 +1,9 @@
+import argparse
 import os
+from typing import Iterator, List, Tuple
 
+import arxiv
+import numpy as np
 from dotenv import load_dotenv
 from langchain.docstore.document import Document
 from langchain.graphs import Neo4jGraph
@@ -7,16 +11,46 @@ from langchain.text_splitter import (
     CharacterTextSplitter,
     RecursiveCharacterTextSplitter,
 )
-from langchain.vectorstores.neo4j_vector import Neo4jVector
 
 import utils.constants as const
-from utils.arxiv_utils import create_paper_object_from_arxiv_id
+from utils.arxiv_utils import (
+    IngestablePaper,
+    convert_pdf_bytes_to_text,
+    create_paper_object_from_arxiv_id,
+    create_paper_object_from_arxiv_result,
+    download_pdf,
+    extract_pdf_link_from_result,
+    fetch_arxiv_result,
+)
+from utils.bulk_import_utils import (
+    BulkImportExporter,
+    create_bulk_import_command,
+    validate_bulk_import_files,
+)
+from utils.checkpoint_utils import BUILD_STAGES, BuildManifest
+from utils.compression_utils import COMPRESSION_METHODS, EmbeddingCompressor
+from utils.crawler_utils import CitationCrawler
 from utils.data_utils import (
-    create_cypher_batch_query_to_create_citation_relationship,
+    ChunkBulkWriter,
+    create_chunk_id,
+    create_chunk_vector_index_query,
+    create_citation_pairs,
+    create_citation_relationships,
     create_cypher_batch_query_to_insert_arxiv_papers,
     create_indices_queries,
-    create_query_for_category_insertion,
+    create_vector_index_query,
+    embed_papers,
+    fetch_arxiv_category_taxonomy,
+    get_citation_pairs_for_new_papers,
+    insert_categories,
+    link_papers_to_chunks,
+    load_category_embeddings,
+    load_category_taxonomy,
+    save_category_taxonomy,
+    stamp_graph_version,
 )
+from utils.dedup_utils import MinHashDeduplicator
+from utils.embedding_utils import BatchedEmbeddingEngine
 from utils.huggingface_utils import cache_and_load_embedding_model
 from utils.neo4j_utils import (
     get_neo4j_credentails,
@@ -24,88 +58,315 @@ from utils.neo4j_utils import (
     reset_neo4j_server,
     wait_for_neo4j_server,
 )
+from utils.pipeline_utils import StagedPipeline
+
+parser = argparse.ArgumentParser(description="Build the arXiv knowledge graph.")
+parser.add_argument(
+    "--export-dir",
+    help="Write neo4j-admin bulk import files to this directory instead of inserting into the running Neo4j server.",
+)
+parser.add_argument(
+    "--from-stage",
+    choices=BUILD_STAGES,
+    help="Redo the given stage and all later ones for every paper, keeping the progress of earlier stages.",
+)
+parser.add_argument(
+    "--restart",
+    action="store_true",
+    help="Discard the saved progress and rebuild the knowledge graph from scratch.",
+)
+parser.add_argument(
+    "--dedup-threshold",
+    type=float,
+    default=const.chunk_dedup_threshold,
+    help="Estimated Jaccard similarity above which a chunk is a near duplicate of an earlier one, e.g. 0.9. 0 disables deduplication.",
+)
+parser.add_argument(
+    "--dedup-mode",
+    choices=["drop", "merge"],
+    default=const.chunk_dedup_mode,
+    help="drop: discard near duplicate chunks. merge: also link the kept chunk to the paper of the dropped one.",
+)
+parser.add_argument(
+    "--compression",
+    choices=["none"] + COMPRESSION_METHODS,
+    default=const.embedding_compression,
+    help="Store chunk embeddings reduced with PCA or truncation, the app applies the same transform to queries.",
+)
+parser.add_argument(
+    "--compressed-dimensions",
+    type=int,
+    default=const.embedding_compressed_dimensions,
+)
+parser.add_argument(
+    "--quantize-int8",
+    action=argparse.BooleanOptionalAction,
+    default=const.embedding_quantize_int8,
+    help="Scalar quantize the reduced embeddings to int8 precision.",
+)
+parser.add_argument(
+    "--crawl-depth",
+    type=int,
+    help="Crawl citations up to this many hops from the seed papers, most cited candidates first, instead of ingesting the seeds and their direct citations.",
+)
+parser.add_argument(
+    "--max-papers",
+    type=int,
+    help="Stop crawling after this many papers.",
+)
+parser.add_argument(
+    "--max-megabytes",
+    type=float,
+    help="Stop crawling after downloading this many MiB of PDFs.",
+)
+parser.add_argument(
+    "--max-crawl-seconds",
+    type=float,
+    help="Stop crawling after this many seconds.",
+)
+parser.add_argument(
+    "--crawl-workers",
+    type=int,
+    default=const.crawler_workers,
+)
+parser.add_argument(
+    "--refresh-taxonomy",
+    action="store_true",
+    help="Scrape the arXiv category taxonomy and save it as a new version of the local taxonomy file before building.",
+)
+args = parser.parse_args()
+export_mode = args.export_dir is not None
 
 load_dotenv()
 
-if not is_neo4j_server_up():
-    reset_neo4j_server()
-    wait_for_neo4j_server()
-
-graph = Neo4jGraph(
-    username=get_neo4j_credentails()["username"],
-    password=get_neo4j_credentails()["password"],
-    url=get_neo4j_credentails()["uri"],
-)
-graph.query("MATCH (n) DETACH DELETE n")
-graph.query(create_query_for_category_insertion())
-
-embedding = cache_and_load_embedding_model()
-
-Neo4jVector.from_existing_graph(
-    embedding=embedding,
-    url=get_neo4j_credentails()["uri"],
-    username=get_neo4j_credentails()["username"],
-    password=get_neo4j_credentails()["password"],
-    index_name="category_embedding_index",
-    node_label="Category",
-    text_node_properties=["title", "description"],
-    embedding_node_property="embedding",
-)
-
-for q in create_indices_queries():
-    graph.query(q)
-
-arxiv_ids_set = set(const.seed_arxiv_paper_ids)
-arxiv_ids_set.update(
-    [
-        cited_paper
-        for cited_papers in [
-            create_paper_object_from_arxiv_id(seed_paper_id).cited_arxiv_papers
-            for seed_paper_id in const.seed_arxiv_paper_ids
-        ]
-        for cited_paper in cited_papers
-    ]
-)
-print(f"Total arxiv papers to insert: {len(arxiv_ids_set)}")
-papers_to_insert = list()
-for arxiv_id in arxiv_ids_set:
-    try:
-        papers_to_insert.append(create_paper_object_from_arxiv_id(arxiv_id))
-        print(f"arxiv paper {arxiv_id} added to the list.")
-    except Exception as e:
-        print(f"Error in creating paper object for arxiv_id {arxiv_id}: {e}")
+# Export mode rewrites its files on every run, so only graph builds resume.
+manifest = None if export_mode else BuildManifest(const.BUILD_PROGRESS_PATH)
+if manifest and args.restart:
+    manifest.clear()
+if manifest and args.from_stage:
+    manifest.reset_from(args.from_stage)
 
-paper_batch = list()
-batch_size = 10
-for i, paper in enumerate(papers_to_insert):
-    if len(paper_batch) < batch_size and i != len(papers_to_insert) - 1:
-        paper_batch.append(paper)
-        continue
-    query = create_cypher_batch_query_to_insert_arxiv_papers(paper_batch)
+if args.refresh_taxonomy:
+    taxonomy_version, _ = load_category_taxonomy(const.CATEGORY_TAXONOMY_PATH)
+    save_category_taxonomy(
+        const.CATEGORY_TAXONOMY_PATH,
+        fetch_arxiv_category_taxonomy(),
+        taxonomy_version + 1,
+    )
+taxonomy_version, categories = load_category_taxonomy(const.CATEGORY_TAXONOMY_PATH)
+print(f"Using arXiv category taxonomy version {taxonomy_version}")
+
+if export_mode:
+    graph = None
+    exporter = BulkImportExporter(args.export_dir)
+    exporter.add_categories(categories)
+else:
+    if not is_neo4j_server_up():
+        reset_neo4j_server()
+        wait_for_neo4j_server()
+
+    graph = Neo4jGraph(
+        username=get_neo4j_credentails()["username"],
+        password=get_neo4j_credentails()["password"],
+        url=get_neo4j_credentails()["uri"],
+    )
+    if not manifest.get_value("graph_initialised"):
+        graph.query("MATCH (n) DETACH DELETE n")
+        category_embeddings = load_category_embeddings(
+            categories,
+            const.embed_model_name,
+            const.CATEGORY_EMBEDDINGS_CACHE_PATH.format(version=taxonomy_version),
+            embed_documents=lambda texts: cache_and_load_embedding_model().embed_documents(
+                texts
+            ),
+        )
+        insert_categories(graph, categories, category_embeddings)
+        graph.query(
+            create_vector_index_query(
+                "category_embedding_index",
+                "Category",
+                len(category_embeddings[0]),
+            )
+        )
+        manifest.set_value("graph_initialised", True)
+    else:
+        print(f"Resuming the knowledge graph build: {manifest.summary()}")
+        if args.dedup_threshold > 0:
+            print(
+                "Deduplication only compares against chunks seen since the build resumed."
+            )
+
+    for q in create_indices_queries():
+        graph.query(q)
+
+    # Chunks are rewritten when chunking is redone, later stages update them
+    # in place.
+    chunked_index = BUILD_STAGES.index("chunked")
+    if args.from_stage and BUILD_STAGES.index(args.from_stage) <= chunked_index:
+        graph.query(
+            """
+        MATCH (c:Chunk)
+        CALL { WITH c DETACH DELETE c } IN TRANSACTIONS OF 10000 ROWS
+        """
+        )
+
+
+def load_or_create_paper(arxiv_id: str) -> IngestablePaper:
+    paper = manifest.load_extracted(arxiv_id) if manifest else None
+    if paper is None:
+        paper = create_paper_object_from_arxiv_id(arxiv_id)
+        if manifest:
+            manifest.save_extracted(arxiv_id, paper)
+    return paper
+
+
+def crawl_paper(arxiv_id: str) -> Tuple[IngestablePaper, int]:
+    paper = manifest.load_extracted(arxiv_id) if manifest else None
+    if paper is not None:
+        return paper, 0
+    result = fetch_arxiv_result(arxiv_id)
+    pdf_content = download_pdf(extract_pdf_link_from_result(result))
+    paper = create_paper_object_from_arxiv_result(
+        result, convert_pdf_bytes_to_text(pdf_content)
+    )
+    if manifest:
+        manifest.save_extracted(arxiv_id, paper)
+    return paper, len(pdf_content)
+
+
+crawler = None
+if args.crawl_depth is not None:
+    # Papers from earlier runs are read back from the manifest cache, they are
+    # still needed to rebuild the frontier.
+    crawler = CitationCrawler(
+        seed_ids=const.seed_arxiv_paper_ids,
+        fetch_fn=crawl_paper,
+        max_depth=args.crawl_depth,
+        max_papers=args.max_papers,
+        max_bytes=int(args.max_megabytes * 2**20) if args.max_megabytes else None,
+        max_seconds=args.max_crawl_seconds,
+        workers=args.crawl_workers,
+        request_interval=const.crawler_request_interval,
+        is_cached=lambda arxiv_id: bool(manifest)
+        and manifest.is_done("extracted", arxiv_id),
+    )
+    print(f"Crawling arxiv citations up to depth {args.crawl_depth}")
+else:
+    arxiv_ids = manifest.get_value("arxiv_ids") if manifest else None
+    if arxiv_ids is None:
+        arxiv_ids_set = set(const.seed_arxiv_paper_ids)
+        arxiv_ids_set.update(
+            [
+                cited_paper
+                for cited_papers in [
+                    load_or_create_paper(seed_paper_id).cited_arxiv_papers
+                    for seed_paper_id in const.seed_arxiv_paper_ids
+                ]
+                for cited_paper in cited_papers
+            ]
+        )
+        arxiv_ids = sorted(arxiv_ids_set)
+        if manifest:
+            manifest.set_value("arxiv_ids", arxiv_ids)
+    print(f"Total arxiv papers to insert: {len(arxiv_ids)}")
+
+# Papers flow through the stages below one at a time. Only the citation lists
+# of inserted papers are kept around, full texts are dropped once chunked.
+inserted_papers_citations = dict()
+# Number of chunks per paper still to be written, see write_stage.
+pending_chunk_counts = dict()
+
+
+def fetch_stage(
+    arxiv_ids: Iterator[str],
+) -> Iterator[Tuple[str, IngestablePaper | Tuple[arxiv.Result, bytes]]]:
+    for arxiv_id in arxiv_ids:
+        if manifest:
+            paper = manifest.load_extracted(arxiv_id)
+            if paper is not None:
+                yield arxiv_id, paper
+                continue
+            fetched = manifest.load_fetched(arxiv_id)
+            if fetched is not None:
+                yield arxiv_id, fetched
+                continue
+        try:
+            result = fetch_arxiv_result(arxiv_id)
+            pdf_content = download_pdf(extract_pdf_link_from_result(result))
+            if manifest:
+                manifest.save_fetched(arxiv_id, result, pdf_content)
+            yield arxiv_id, (result, pdf_content)
+        except Exception as e:
+            print(f"Error in fetching arxiv paper {arxiv_id}: {e}")
+
+
+def extract_stage(
+    fetched: Iterator[Tuple[str, IngestablePaper | Tuple[arxiv.Result, bytes]]]
+) -> Iterator[IngestablePaper]:
+    for arxiv_id, item in fetched:
+        if isinstance(item, IngestablePaper):
+            yield item
+            continue
+        result, pdf_content = item
+        try:
+            paper = create_paper_object_from_arxiv_result(
+                result, convert_pdf_bytes_to_text(pdf_content)
+            )
+            if manifest:
+                manifest.save_extracted(arxiv_id, paper)
+            yield paper
+        except Exception as e:
+            print(f"Error in creating paper object for {result.entry_id}: {e}")
+
+
+def insert_papers(paper_batch: List[IngestablePaper]) -> List[IngestablePaper]:
+    if export_mode:
+        exporter.add_papers(paper_batch)
+        return paper_batch
     try:
-        graph.query(query)
+        graph.query(create_cypher_batch_query_to_insert_arxiv_papers(paper_batch))
         print(f"Inserted papers {[p.arxiv_id for p in paper_batch]}")
+        return paper_batch
     except Exception as e:
+        inserted = list()
         for p in paper_batch:
-            query = create_cypher_batch_query_to_insert_arxiv_papers([p])
             try:
-                graph.query(query)
+                graph.query(create_cypher_batch_query_to_insert_arxiv_papers([p]))
                 print(f"Inserted paper {p.arxiv_id}")
+                inserted.append(p)
             except Exception as e:
                 print(f"Error in inserting paper {p.arxiv_id}")
-    paper_batch.clear()
+        return inserted
+
+
+def insert_and_record_papers(
+    paper_batch: List[IngestablePaper],
+) -> List[IngestablePaper]:
+    inserted = insert_papers(paper_batch)
+    if manifest:
+        manifest.mark("inserted", [p.arxiv_id for p in inserted])
+    for p in inserted:
+        inserted_papers_citations[p.arxiv_id] = p.cited_arxiv_papers
+    return inserted
 
 
-# create citation relationships
-for paper in papers_to_insert:
-    query = create_cypher_batch_query_to_create_citation_relationship(paper.arxiv_id)
-    graph.query(query)
-    print(f"Created citation relationships for paper {paper.arxiv_id}")
+def insert_stage(papers: Iterator[IngestablePaper]) -> Iterator[IngestablePaper]:
+    paper_batch = list()
+    batch_size = 10
+    for paper in papers:
+        if manifest and manifest.is_done("inserted", paper.arxiv_id):
+            inserted_papers_citations[paper.arxiv_id] = paper.cited_arxiv_papers
+            yield paper
+            continue
+        paper_batch.append(paper)
+        if len(paper_batch) < batch_size:
+            continue
+        yield from insert_and_record_papers(paper_batch)
+        paper_batch = list()
+    if paper_batch:
+        yield from insert_and_record_papers(paper_batch)
+
 
-raw_docs = [
-    Document(page_content=p.full_text, metadata={"arxiv_id": p.arxiv_id})
-    for p in papers_to_insert
-]
 # Define chunking strategy
 text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
     encoding_name="cl100k_base",
@@ -113,56 +374,284 @@ text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
     chunk_overlap=20,
     disallowed_special=(),
 )
-# Chunk the document
-documents = text_splitter.split_documents(raw_docs)
-print(f"Number of chunks to be inserted into the knowledge graph: {len(documents)}")
 
-document_batch = list()
-batch_size = 50
-for i, doc in enumerate(documents):
-    document_batch.append(doc)
-    if len(document_batch) < batch_size and i != len(documents) - 1:
-        continue
-    try:
-        Neo4jVector.from_documents(
-            documents=document_batch,
-            embedding=embedding,
-            url=get_neo4j_credentails()["uri"],
-            username=get_neo4j_credentails()["username"],
-            password=get_neo4j_credentails()["password"],
+
+def chunk_stage(
+    papers: Iterator[IngestablePaper],
+) -> Iterator[Tuple[str, List[Document]]]:
+    for paper in papers:
+        raw_doc = Document(
+            page_content=paper.full_text, metadata={"arxiv_id": paper.arxiv_id}
         )
-        print(f"Inserted chunk {i+1}/{len(documents)}")
-    except Exception as e:
-        for d in document_batch:
-            try:
-                Neo4jVector.from_documents(
-                    documents=[d],
-                    embedding=embedding,
-                    url=get_neo4j_credentails()["uri"],
-                    username=get_neo4j_credentails()["username"],
-                    password=get_neo4j_credentails()["password"],
-                )
-            except Exception as e:
-                print(f"Error in inserting chunk: {e}")
-    document_batch.clear()
+        paper.full_text = ""
+        documents = text_splitter.split_documents([raw_doc])
+        if manifest:
+            manifest.mark("chunked", [paper.arxiv_id])
+        yield paper.arxiv_id, documents
 
-# Link the chunks to the papers
-graph.query(
-    """
-MATCH (p:Paper), (c:Chunk)
-WHERE p.id = c.arxiv_id
-MERGE (p)-[:CONTAINS_TEXT]->(c)
-"""
+
+deduplicator = (
+    MinHashDeduplicator(threshold=args.dedup_threshold)
+    if args.dedup_threshold > 0
+    else None
+)
+# (paper, kept chunk id) pairs for chunks dropped as near duplicates of a
+# chunk from another paper.
+duplicate_chunk_links = list()
+
+
+def dedup_stage(
+    chunked_papers: Iterator[Tuple[str, List[Document]]]
+) -> Iterator[List[Document]]:
+    for arxiv_id, documents in chunked_papers:
+        if deduplicator and documents:
+            documents, duplicates = deduplicator.deduplicate(
+                documents,
+                key_fn=lambda d: create_chunk_id(
+                    d.metadata["arxiv_id"], d.page_content
+                ),
+            )
+            duplicate_chunk_links.extend(
+                (d.metadata["arxiv_id"], duplicate_of) for d, duplicate_of in duplicates
+            )
+        if manifest:
+            if documents:
+                pending_chunk_counts[documents[0].metadata["arxiv_id"]] = len(documents)
+            else:
+                manifest.mark("embedded", [arxiv_id])
+        yield documents
+
+
+embedding_engine = BatchedEmbeddingEngine(precision=const.embedding_precision)
+
+
+def embed_stage(
+    chunked_papers: Iterator[List[Document]],
+) -> Iterator[List[Tuple[Document, List[float]]]]:
+    documents = (d for documents in chunked_papers for d in documents)
+    yield from embedding_engine.embed_documents(documents)
+
+
+# Exports keep their compressor next to the import files, load-bulk-import.py
+# installs it once the graph the app queries is replaced.
+compressor_path = (
+    os.path.join(args.export_dir, os.path.basename(const.EMBEDDING_COMPRESSOR_PATH))
+    if export_mode
+    else const.EMBEDDING_COMPRESSOR_PATH
+)
+
+
+def load_or_create_compressor() -> EmbeddingCompressor | None:
+    if manifest and manifest.done("embedded"):
+        # Chunks already in the graph decide the format of the vector index.
+        if os.path.exists(compressor_path):
+            return EmbeddingCompressor.load(compressor_path)
+        return None
+    if os.path.exists(compressor_path):
+        os.remove(compressor_path)
+    if args.compression == "none":
+        return None
+    return EmbeddingCompressor(
+        method=args.compression,
+        dimensions=args.compressed_dimensions,
+        quantize_int8=args.quantize_int8,
+    )
+
+
+compressor = load_or_create_compressor()
+
+
+def compress_batches(
+    embedded_batches: List[List[Tuple[Document, List[float]]]]
+) -> Iterator[List[Tuple[Document, List[float]]]]:
+    if not compressor.is_fitted:
+        compressor.fit(np.array([v for b in embedded_batches for _, v in b]))
+        compressor.save(compressor_path)
+        print(
+            f"Fitted {compressor.method} embedding compressor to {compressor.dimensions} dimensions (int8: {compressor.quantize_int8})"
+        )
+    for b in embedded_batches:
+        vectors = compressor.transform(np.array([v for _, v in b]))
+        yield [(d, v) for (d, _), v in zip(b, vectors.tolist())]
+
+
+def compress_stage(
+    embedded_batches: Iterator[List[Tuple[Document, List[float]]]]
+) -> Iterator[List[Tuple[Document, List[float]]]]:
+    if compressor is None:
+        yield from embedded_batches
+        return
+    # The compressor is fitted on the first embedded chunks of the corpus.
+    fit_batches = list()
+    for embedded_batch in embedded_batches:
+        if compressor.is_fitted:
+            yield from compress_batches([embedded_batch])
+            continue
+        fit_batches.append(embedded_batch)
+        if sum(len(b) for b in fit_batches) >= const.embedding_compression_fit_samples:
+            yield from compress_batches(fit_batches)
+            fit_batches = list()
+    if fit_batches:
+        yield from compress_batches(fit_batches)
+
+
+if not export_mode:
+    graph.query(
+        create_chunk_vector_index_query(
+            compressor.dimensions
+            if compressor
+            else embedding_engine.model.get_sentence_embedding_dimension()
+        )
+    )
+    chunk_writer = ChunkBulkWriter(
+        uri=get_neo4j_credentails()["uri"],
+        username=get_neo4j_credentails()["username"],
+        password=get_neo4j_credentails()["password"],
+        rows_per_transaction=const.chunk_rows_per_transaction,
+    )
+
+
+def mark_embedded_papers():
+    embedded = [
+        arxiv_id
+        for arxiv_id, count in list(pending_chunk_counts.items())
+        if chunk_writer.written_per_paper[arxiv_id] >= count
+    ]
+    for arxiv_id in embedded:
+        del pending_chunk_counts[arxiv_id]
+    manifest.mark("embedded", embedded)
+
+
+def write_stage(
+    embedded_batches: Iterator[List[Tuple[Document, List[float]]]]
+) -> Iterator[int]:
+    if export_mode:
+        for embedded_batch in embedded_batches:
+            exporter.add_chunks(embedded_batch)
+            yield len(embedded_batch)
+        return
+    with chunk_writer:
+        for embedded_batch in embedded_batches:
+            written = chunk_writer.write(embedded_batch)
+            if written:
+                print(f"Inserted {chunk_writer.written_count} chunks")
+                mark_embedded_papers()
+            yield written
+        chunk_writer.flush()
+        mark_embedded_papers()
+
+
+if crawler:
+    pipeline = StagedPipeline(
+        source=(
+            paper
+            for paper in crawler.crawl()
+            if not (manifest and manifest.is_done("embedded", paper.arxiv_id))
+        ),
+        queue_size=4,
+    )
+else:
+    pipeline = (
+        StagedPipeline(
+            source=[
+                arxiv_id
+                for arxiv_id in arxiv_ids
+                if not (manifest and manifest.is_done("embedded", arxiv_id))
+            ],
+            queue_size=4,
+        )
+        .add_stage("fetch", fetch_stage)
+        .add_stage("extract", extract_stage)
+    )
+pipeline = (
+    pipeline.add_stage("insert", insert_stage)
+    .add_stage("chunk", chunk_stage)
+    .add_stage("dedup", dedup_stage)
+    .add_stage("embed", embed_stage)
+    .add_stage("compress", compress_stage)
+    .add_stage("write", write_stage)
 )
+pipeline.consume()
+if crawler:
+    print(crawler.report())
+
+
+def print_dedup_report():
+    if not deduplicator:
+        return
+    print(
+        f"Deduplication dropped {deduplicator.dropped_count}/{deduplicator.seen_count} chunks ({100 * deduplicator.dropped_ratio:.1f}% smaller vector index)"
+    )
+    if embedding_engine.chunks_per_second:
+        print(
+            f"Estimated embedding time saved: {deduplicator.dropped_count / embedding_engine.chunks_per_second:.1f}s"
+        )
 
-# Delete orphan chunks with no papers
+
+if export_mode:
+    # keep dropped duplicates reachable from every paper they appeared in
+    if args.dedup_mode == "merge":
+        exporter.add_chunk_links(duplicate_chunk_links)
+    exporter.add_citations(
+        create_citation_pairs(
+            inserted_papers_citations, inserted_papers_citations.keys()
+        )
+    )
+    exporter.close()
+    for file_name, count in exporter.counts.items():
+        print(f"Exported {count} rows to {file_name}")
+    errors = validate_bulk_import_files(args.export_dir)
+    for error in errors:
+        print(f"Invalid bulk import file: {error}")
+    print(pipeline.report())
+    print_dedup_report()
+    print(
+        f"Embedded {embedding_engine.embedded_count} chunks at {embedding_engine.chunks_per_second:.1f} chunks/s ({embedding_engine.precision})"
+    )
+    print(
+        "Import the files with the following command against a stopped Neo4j instance, then run load-bulk-import.py:"
+    )
+    print(create_bulk_import_command(os.path.abspath(args.export_dir)))
+    if errors:
+        raise SystemExit(1)
+    raise SystemExit(0)
+
+# keep dropped duplicates reachable from every paper they appeared in
+if args.dedup_mode == "merge":
+    link_papers_to_chunks(
+        graph,
+        [(arxiv_id, chunk_id) for arxiv_id, chunk_id in duplicate_chunk_links],
+    )
+
+# create citation relationships for papers inserted since the last citation pass
+papers_to_cite = manifest.done("inserted") - manifest.done("cited")
+if papers_to_cite:
+    citations_to_create = {
+        r["id"]: r["cited_arxiv_papers"]
+        for r in graph.query(
+            """
+            MATCH (p:Paper) WHERE p.id IN $ids
+            RETURN p.id AS id, p.cited_arxiv_papers AS cited_arxiv_papers
+            """,
+            params={"ids": list(papers_to_cite)},
+        )
+    }
+    create_citation_relationships(
+        graph, get_citation_pairs_for_new_papers(graph, citations_to_create)
+    )
+    manifest.mark("cited", papers_to_cite)
+
+# embed paper titles and summaries for the hierarchical paper-then-chunk search
 graph.query(
-    """
-MATCH (c:Chunk)
-WHERE NOT (c)<-[:CONTAINS_TEXT]-()
-DETACH DELETE c
-"""
+    create_vector_index_query(
+        "paper_embedding_index",
+        "Paper",
+        embedding_engine.model.get_sentence_embedding_dimension(),
+    )
 )
+print(f"Embedded {embed_papers(graph, embedding_engine.embed_paper_texts)} papers")
+
+graph_version = stamp_graph_version(graph, const.embed_model_name)
 
 # Get the number of chunks finally present in the DB
 chunk_count = graph.query(
@@ -173,3 +662,12 @@ RETURN COUNT(c) as chunk_count
 )[0]["chunk_count"]
 
 print(f"Number of chunks in the inserted into the knowledge graph: {chunk_count}")
+print(f"Build progress: {manifest.summary()}, graph version {graph_version}")
+print_dedup_report()
+print(pipeline.report())
+print(
+    f"Chunk writer: {chunk_writer.written_count} written, {chunk_writer.failed_count} failed, {chunk_writer.unmatched_count} without paper, {chunk_writer.transaction_count} transactions, {chunk_writer.write_seconds:.1f}s"
+)
+print(
+    f"Embedded {embedding_engine.embedded_count} chunks at {embedding_engine.chunks_per_second:.1f} chunks/s ({embedding_engine.precision})"
+)
@@ -0,0 +1,120 @@
+import argparse
+import os
+import shutil
+
+from dotenv import load_dotenv
+from langchain.graphs import Neo4jGraph
+
+import utils.constants as const
+from utils.bulk_import_utils import validate_bulk_import_files
+from utils.data_utils import (
+    create_chunk_vector_index_query,
+    create_indices_queries,
+    create_vector_index_query,
+    embed_papers,
+    insert_categories,
+    load_category_embeddings,
+    load_category_taxonomy,
+    stamp_graph_version,
+)
+from utils.huggingface_utils import (
+    cache_and_load_embedding_model,
+    load_query_embedding_model,
+)
+from utils.neo4j_utils import (
+    get_neo4j_credentails,
+    is_neo4j_server_up,
+    wait_for_neo4j_server,
+)
+
+# Second half of the offline build: `ingest-arxiv-data.py --export-dir` writes
+# the import files, `neo4j-admin database import` loads them, and this script
+# validates them and creates the indexes on the freshly imported graph.
+parser = argparse.ArgumentParser(
+    description="Validate bulk import files and create indexes after neo4j-admin import."
+)
+parser.add_argument("import_dir", help="Directory written by --export-dir.")
+parser.add_argument(
+    "--validate-only",
+    action="store_true",
+    help="Only validate the import files, no Neo4j server is needed.",
+)
+args = parser.parse_args()
+
+errors = validate_bulk_import_files(args.import_dir)
+for error in errors:
+    print(f"Invalid bulk import file: {error}")
+if errors:
+    raise SystemExit(1)
+print(f"Bulk import files in {args.import_dir} are valid.")
+if args.validate_only:
+    raise SystemExit(0)
+
+load_dotenv()
+
+if not is_neo4j_server_up():
+    wait_for_neo4j_server()
+
+graph = Neo4jGraph(
+    username=get_neo4j_credentails()["username"],
+    password=get_neo4j_credentails()["password"],
+    url=get_neo4j_credentails()["uri"],
+)
+
+for q in create_indices_queries():
+    graph.query(q)
+
+# Query embeddings have to go through the compressor the exported chunk
+# embeddings were produced with, or through none at all.
+import_compressor_path = os.path.join(
+    args.import_dir, os.path.basename(const.EMBEDDING_COMPRESSOR_PATH)
+)
+if os.path.exists(import_compressor_path):
+    os.makedirs(os.path.dirname(const.EMBEDDING_COMPRESSOR_PATH), exist_ok=True)
+    shutil.copyfile(import_compressor_path, const.EMBEDDING_COMPRESSOR_PATH)
+elif os.path.exists(const.EMBEDDING_COMPRESSOR_PATH):
+    os.remove(const.EMBEDDING_COMPRESSOR_PATH)
+
+embedding = cache_and_load_embedding_model()
+graph.query(
+    create_chunk_vector_index_query(
+        len(load_query_embedding_model().embed_query("dimension probe"))
+    )
+)
+
+categories = graph.query(
+    """
+MATCH (c:Category)
+RETURN c.code AS code, coalesce(c.title, "") AS title, coalesce(c.description, "") AS description
+"""
+)
+taxonomy_version, _ = load_category_taxonomy(const.CATEGORY_TAXONOMY_PATH)
+category_embeddings = load_category_embeddings(
+    categories,
+    const.embed_model_name,
+    const.CATEGORY_EMBEDDINGS_CACHE_PATH.format(version=taxonomy_version),
+    embed_documents=embedding.embed_documents,
+)
+insert_categories(graph, categories, category_embeddings)
+graph.query(
+    create_vector_index_query(
+        "category_embedding_index", "Category", len(category_embeddings[0])
+    )
+)
+
+graph.query(
+    create_vector_index_query(
+        "paper_embedding_index", "Paper", len(category_embeddings[0])
+    )
+)
+print(f"Embedded {embed_papers(graph, embedding.embed_documents)} papers")
+
+counts = graph.query(
+    """
+MATCH (n)
+RETURN labels(n)[0] AS label, COUNT(n) AS count
+"""
+)
+for c in counts:
+    print(f"{c['label']}: {c['count']} nodes")
+print(f"Graph version: {stamp_graph_version(graph, const.embed_model_name)}")
@@ -2,15 +2,15 @@ import os
 
 import streamlit as st
 
-from utils.neo4j_utils import is_neo4j_server_up, reset_neo4j_server
-
-# Trigger Neo4j server in background.
-if not is_neo4j_server_up():
-    reset_neo4j_server()
+import streamlit_pages.commons as st_commons
 
 cwd = os.getcwd()
 
 st.set_page_config(layout="wide", initial_sidebar_state="collapsed")
+# Starts Neo4j and loads the models in background threads, once per process,
+# and the local LLM once a session uses it.
+warmup = st_commons.get_warmup_service()
+st_commons.warm_up_session_llm()
 pg = st.navigation(
     [
         st.Page(
@@ -30,4 +30,6 @@ pg = st.navigation(
         ),
     ]
 )
+with st.sidebar.expander("Warm-up status", expanded=not warmup.is_ready()):
+    st_commons.show_warmup_status()
 pg.run()
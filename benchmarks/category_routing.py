@@ -0,0 +1,121 @@
+import argparse
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain.graphs import Neo4jGraph
+from langchain_community.vectorstores import Neo4jVector
+
+import utils.constants as const
+import utils.retriever_utils as ret_utils
+from benchmarks.embedding_compression import questions
+from benchmarks.embedding_throughput import chunks_from_graph
+from utils.data_utils import create_chunk_id
+from utils.huggingface_utils import load_query_embedding_model
+from utils.neo4j_utils import get_neo4j_credentails
+
+
+def chunk_ids(documents) -> List[str]:
+    # Neo4jVector leaves the chunk id out of the document metadata.
+    return [create_chunk_id(d.metadata["arxiv_id"], d.page_content) for d in documents]
+
+
+def run(
+    queries: List[str],
+    k: int,
+    graph: Neo4jGraph,
+    document_index: Neo4jVector,
+    expected: Dict[str, List[str]],
+    top_categories: int,
+    min_category_score: float,
+) -> None:
+    ret_utils.category_routing_stats.clear()
+    latencies, recalls = list(), list()
+    for q in queries:
+        start = time.perf_counter()
+        documents = ret_utils.category_routed_search(
+            q,
+            k,
+            graph,
+            document_index,
+            top_categories=top_categories,
+            min_category_score=min_category_score,
+        )
+        latencies.append(1000 * (time.perf_counter() - start))
+        recalls.append(len(set(chunk_ids(documents)) & set(expected[q])) / k)
+    stats: Counter = ret_utils.category_routing_stats
+    print(
+        f"top {top_categories} categories, min score {min_category_score}: "
+        f"{np.mean(latencies):.1f} ms/query (p95 {np.percentile(latencies, 95):.1f}), "
+        f"recall@{k} {np.mean(recalls):.3f}, "
+        f"routed {stats['routed']}/{len(queries)} {dict(stats)}"
+    )
+
+
+def connect() -> Tuple[Neo4jGraph, Neo4jVector]:
+    graph = Neo4jGraph(
+        username=get_neo4j_credentails()["username"],
+        password=get_neo4j_credentails()["password"],
+        url=get_neo4j_credentails()["uri"],
+    )
+    document_index = Neo4jVector(
+        embedding=load_query_embedding_model(),
+        url=get_neo4j_credentails()["uri"],
+        username=get_neo4j_credentails()["username"],
+        password=get_neo4j_credentails()["password"],
+    )
+    counts = graph.query(
+        """
+    MATCH (c:Chunk) WITH COUNT(c) AS chunks
+    MATCH (p:Paper) RETURN chunks, COUNT(p) AS papers
+    """
+    )[0]
+    print(f"Corpus: {counts['papers']} papers, {counts['chunks']} chunks")
+    return graph, document_index
+
+
+def unrestricted_search(
+    queries: List[str], k: int, document_index: Neo4jVector
+) -> Dict[str, List[str]]:
+    # Unrestricted search is both the baseline and the reference for recall.
+    expected, latencies = dict(), list()
+    for q in queries:
+        start = time.perf_counter()
+        expected[q] = chunk_ids(document_index.similarity_search(q, k=k))
+        latencies.append(1000 * (time.perf_counter() - start))
+    print(
+        f"unrestricted: {np.mean(latencies):.1f} ms/query (p95 {np.percentile(latencies, 95):.1f})"
+    )
+    return expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Latency and recall@k of category routed chunk search against unrestricted vector search."
+    )
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--top-categories", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument(
+        "--min-category-scores",
+        type=float,
+        nargs="+",
+        default=[0.0, const.category_routing_min_score],
+    )
+    args = parser.parse_args()
+
+    graph, document_index = connect()
+    queries = questions(chunks_from_graph(10 * args.num_queries), args.num_queries)
+    expected = unrestricted_search(queries, args.k, document_index)
+    for top_categories in args.top_categories:
+        for min_category_score in args.min_category_scores:
+            run(
+                queries,
+                args.k,
+                graph,
+                document_index,
+                expected,
+                top_categories,
+                min_category_score,
+            )
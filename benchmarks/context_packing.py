@@ -0,0 +1,114 @@
+import argparse
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.language_models.llms import BaseLLM
+
+import utils.constants as const
+from benchmarks.category_routing import connect
+from streamlit_pages.commons import example_questions
+from utils.arxiv_utils import PaperChunk
+from utils.context_utils import (
+    ContextPacker,
+    context_token_budget,
+    prompt_token_budget,
+)
+from utils.huggingface_utils import (
+    count_tokens,
+    load_local_model,
+    max_new_tokens_kwargs,
+)
+from utils.knowledge_graph_rag import KnowledgeGraphRAG
+from utils.vanilla_rag import VanillaRAG
+
+
+def unpacked_context(chunks: List[PaperChunk]) -> str:
+    # The context as it was built before packing, every chunk in full.
+    context = ""
+    for chunk in chunks:
+        context += f"Document:{chunk.text}\n"
+        context += f"Document arXiv ID: {chunk.paper.arxiv_id}\n"
+        context += "\n\n"
+    return context
+
+
+def prefill_ms(llm: BaseLLM, prompt: str) -> float:
+    # Time to the first generated token, dominated by processing the prompt.
+    start = time.perf_counter()
+    llm.invoke(prompt, **max_new_tokens_kwargs(llm, 1))
+    return 1000 * (time.perf_counter() - start)
+
+
+def run(name: str, llm: BaseLLM, prompts: List[str], timed: bool):
+    tokens = np.array([count_tokens(llm, p) for p in prompts])
+    line = f"{name}: {tokens.mean():.0f} prompt tokens on average, max {tokens.max()}"
+    if timed:
+        latencies = [prefill_ms(llm, p) for p in prompts]
+        line += f", prefill {np.mean(latencies):.0f} ms (p95 {np.percentile(latencies, 95):.0f})"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Prompt tokens and prefill latency of the RAG answer prompt with and without context packing."
+    )
+    parser.add_argument(
+        "--rag", choices=["knowledge_graph", "vanilla"], default="vanilla"
+    )
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument(
+        "--max-prompt-tokens",
+        type=int,
+        help="Prompt budget, by default the one of the app for the loaded model.",
+    )
+    parser.add_argument("--num-questions", type=int, default=len(example_questions))
+    parser.add_argument(
+        "--model-path", help="Local model to count tokens and time prefill with."
+    )
+    parser.add_argument(
+        "--no-prefill", action="store_true", help="Only count the prompt tokens."
+    )
+    args = parser.parse_args()
+
+    graph, document_index = connect()
+    llm = load_local_model(model_path=args.model_path)
+    rag_class = KnowledgeGraphRAG if args.rag == "knowledge_graph" else VanillaRAG
+    rag = rag_class(
+        graphDbInstance=graph,
+        document_index=document_index,
+        llm=llm,
+        top_k=args.top_k,
+        bos_token=const.llama3_bos_token,
+    )
+    template = const.llama3_bos_token + (
+        rag._initial_prompt_template
+        if args.rag == "knowledge_graph"
+        else rag._prompt_template
+    )
+
+    max_prompt_tokens = args.max_prompt_tokens or prompt_token_budget(llm)
+    unpacked, packed, stats = list(), list(), list()
+    for question in example_questions[: args.num_questions]:
+        chunks = rag.retrieve_chunks(question)
+        unpacked.append(
+            template.format(question=question, context=unpacked_context(chunks))
+        )
+        start = time.perf_counter()
+        packer = ContextPacker(
+            llm,
+            context_token_budget(
+                llm,
+                template.format(question=question, context=""),
+                max_prompt_tokens,
+            ),
+        )
+        context = packer.pack(chunks)
+        packer.stats["packing_ms"] = 1000 * (time.perf_counter() - start)
+        packed.append(template.format(question=question, context=context))
+        stats.append(packer.stats)
+
+    run("whole chunks", llm, unpacked, not args.no_prefill)
+    run(f"packed to {max_prompt_tokens} tokens", llm, packed, not args.no_prefill)
+    for key in ["merged_chunks", "truncated_chunks", "dropped_chunks", "packing_ms"]:
+        print(f"{key}: {np.mean([s[key] for s in stats]):.1f} per question")
@@ -0,0 +1,96 @@
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+import streamlit_pages.commons as st_commons
+from benchmarks.embedding_throughput import chunks_from_graph, synthetic_chunks
+from utils.compression_utils import COMPRESSION_METHODS, EmbeddingCompressor
+from utils.huggingface_utils import cache_and_load_embedding_model
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ corpus.T
+    candidates = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall_at_k(expected: np.ndarray, actual: np.ndarray) -> float:
+    hits = [len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]
+    return float(np.mean(hits))
+
+
+def search_latency_ms(corpus: np.ndarray, queries: np.ndarray, k: int) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        top_k(corpus, q[None, :], k)
+    return 1000 * (time.perf_counter() - start) / len(queries)
+
+
+def questions(texts: List[str], num_queries: int) -> List[str]:
+    # Example questions from the app plus the first sentence of random chunks.
+    rng = np.random.RandomState(0)
+    sentences = [
+        texts[i].split(".")[0][:300]
+        for i in rng.choice(len(texts), num_queries, replace=False)
+    ]
+    return st_commons.example_questions + sentences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Index size, search latency and recall@k of compressed embeddings against full precision."
+    )
+    parser.add_argument("--num-chunks", type=int, default=5000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[128, 256, 512])
+    parser.add_argument(
+        "--methods", choices=COMPRESSION_METHODS, nargs="+", default=["pca"]
+    )
+    args = parser.parse_args()
+
+    texts = (
+        synthetic_chunks(args.num_chunks)
+        if args.synthetic
+        else chunks_from_graph(args.num_chunks)
+    )
+    embedding = cache_and_load_embedding_model()
+    corpus = np.array(embedding.embed_documents(texts), dtype=np.float32)
+    queries = np.array(
+        embedding.embed_documents(questions(texts, args.num_queries)), dtype=np.float32
+    )
+    expected = top_k(corpus, queries, args.k)
+
+    print(f"{len(texts)} chunks, {len(queries)} queries, recall@{args.k}")
+    print(
+        f"full precision: {corpus.shape[1]} dims, {corpus.shape[1] * 4} bytes/vector, "
+        f"{corpus.shape[1] * 4 * len(corpus) / 2**20:.1f} MiB, "
+        f"{search_latency_ms(corpus, queries, args.k):.2f} ms/query"
+    )
+    for method in args.methods:
+        for dimensions in args.dimensions:
+            for quantize_int8 in (False, True):
+                compressor = EmbeddingCompressor(method, dimensions, quantize_int8)
+                compressor.fit(corpus[: 4 * dimensions])
+                compressed_corpus = compressor.transform(corpus)
+                compressed_queries = compressor.transform(queries)
+                actual = top_k(compressed_corpus, compressed_queries, args.k)
+                size = compressor.bytes_per_vector()
+                print(
+                    f"{method} {dimensions} dims{' int8' if quantize_int8 else ''}: "
+                    f"{size} bytes/vector stored by Neo4j, {size * len(corpus) / 2**20:.1f} MiB, "
+                    f"{search_latency_ms(compressed_corpus, compressed_queries, args.k):.2f} ms/query, "
+                    f"recall@{args.k} {recall_at_k(expected, actual):.3f}"
+                )
+                if quantize_int8:
+                    code_size = compressor.code_bytes_per_vector()
+                    print(
+                        f"  int8 codes, not stored by Neo4j: {code_size} bytes/vector, "
+                        f"{code_size * len(corpus) / 2**20:.1f} MiB"
+                    )
@@ -0,0 +1,107 @@
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from benchmarks.embedding_compression import questions, recall_at_k, top_k
+from utils.embedding_utils import EMBEDDING_PRECISIONS, BatchedEmbeddingEngine
+from utils.huggingface_utils import cache_and_load_embedding_model
+
+
+def synthetic_chunks(num_chunks: int, seed: int = 0) -> List[str]:
+    # Mimics the ingestion chunk length distribution: mostly full 1000 token
+    # chunks plus a tail of short ones at the end of every paper.
+    rng = random.Random(seed)
+    words = "the model attention layer graph paper token retrieval embedding vector citation training data language".split()
+    chunks = list()
+    for _ in range(num_chunks):
+        length = 750 if rng.random() < 0.7 else rng.randint(20, 700)
+        chunks.append(" ".join(rng.choice(words) for _ in range(length)))
+    return chunks
+
+
+def chunks_from_graph(num_chunks: int) -> List[str]:
+    from langchain.graphs import Neo4jGraph
+
+    from utils.neo4j_utils import get_neo4j_credentails
+
+    graph = Neo4jGraph(
+        username=get_neo4j_credentails()["username"],
+        password=get_neo4j_credentails()["password"],
+        url=get_neo4j_credentails()["uri"],
+    )
+    results = graph.query(
+        "MATCH (c:Chunk) RETURN c.text AS text LIMIT $limit",
+        params={"limit": num_chunks},
+    )
+    return [r["text"] for r in results]
+
+
+def baseline(texts: List[str]) -> Tuple[float, np.ndarray]:
+    # Neo4jVector.from_documents behaviour: default settings, batches of 50 in
+    # document order.
+    embedding = cache_and_load_embedding_model()
+    embedding.embed_documents(texts[:8])
+    vectors = list()
+    start = time.perf_counter()
+    for i in range(0, len(texts), 50):
+        vectors.extend(embedding.embed_documents(texts[i : i + 50]))
+    return len(texts) / (time.perf_counter() - start), np.array(vectors)
+
+
+def engine(
+    texts: List[str], precision: str, batch_size: int
+) -> Tuple[float, np.ndarray]:
+    e = BatchedEmbeddingEngine(precision=precision, batch_size=batch_size)
+    e.embed_texts(texts[:8])
+    e.embedded_count, e.embedding_seconds = 0, 0.0
+    vectors = e.embed_texts(texts)
+    return e.chunks_per_second, np.array(vectors)
+
+
+def agreement(reference: np.ndarray, vectors: np.ndarray) -> float:
+    # Mean cosine similarity between the vectors of the same chunk.
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return float(np.mean(np.sum(reference * vectors, axis=1)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare ingestion embedding throughput and recall against the LangChain fp32 default."
+    )
+    parser.add_argument("--num-chunks", type=int, default=1000)
+    parser.add_argument("--from-graph", action="store_true")
+    parser.add_argument(
+        "--precision", choices=EMBEDDING_PRECISIONS, nargs="+", default=["fp32"]
+    )
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    texts = (
+        chunks_from_graph(args.num_chunks)
+        if args.from_graph
+        else synthetic_chunks(args.num_chunks)
+    )
+    print(f"Embedding {len(texts)} chunks")
+    baseline_rate, reference = baseline(texts)
+    print(f"baseline (fp32, batch 50, document order): {baseline_rate:.1f} chunks/s")
+    # Queries are always embedded by the fp32 query model of the app, so a lower
+    # precision index is searched with vectors of a different model.
+    queries = np.array(
+        cache_and_load_embedding_model().embed_documents(
+            questions(texts, min(args.num_queries, len(texts)))
+        )
+    )
+    expected = top_k(reference, queries, args.k)
+    for precision in args.precision:
+        rate, vectors = engine(texts, precision, args.batch_size)
+        print(
+            f"engine ({precision}, batch {args.batch_size}, length bucketed): {rate:.1f} chunks/s, {rate / baseline_rate:.2f}x, "
+            f"cosine to fp32 {agreement(reference, vectors):.4f}, "
+            f"recall@{args.k} against fp32 {recall_at_k(expected, top_k(vectors, queries, args.k)):.3f}"
+        )
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+import numpy as np
+
+import utils.retriever_utils as ret_utils
+from benchmarks.category_routing import chunk_ids, connect, unrestricted_search
+from benchmarks.embedding_compression import questions
+from benchmarks.embedding_throughput import chunks_from_graph
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Latency and recall@k of hierarchical paper-then-chunk search against flat chunk search."
+    )
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--top-papers", type=int, nargs="+", default=[5, 10, 20, 50])
+    args = parser.parse_args()
+
+    graph, document_index = connect()
+    queries = questions(chunks_from_graph(10 * args.num_queries), args.num_queries)
+    expected = unrestricted_search(queries, args.k, document_index)
+    for top_papers in args.top_papers:
+        ret_utils.hierarchical_search_stats.clear()
+        latencies, recalls = list(), list()
+        for q in queries:
+            start = time.perf_counter()
+            documents = ret_utils.hierarchical_search(
+                q, args.k, graph, document_index, top_papers=top_papers
+            )
+            latencies.append(1000 * (time.perf_counter() - start))
+            recalls.append(len(set(chunk_ids(documents)) & set(expected[q])) / args.k)
+        print(
+            f"top {top_papers} papers: {np.mean(latencies):.1f} ms/query "
+            f"(p95 {np.percentile(latencies, 95):.1f}), "
+            f"recall@{args.k} {np.mean(recalls):.3f}, "
+            f"{dict(ret_utils.hierarchical_search_stats)}"
+        )
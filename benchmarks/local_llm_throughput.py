@@ -0,0 +1,103 @@
+import argparse
+import gc
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.language_models.llms import BaseLLM
+
+import utils.constants as const
+from streamlit_pages.commons import example_questions
+from utils.huggingface_utils import (
+    LOCAL_LLM_BACKENDS,
+    count_tokens,
+    load_local_model,
+    max_new_tokens_kwargs,
+)
+
+_prompt_template = """<|start_header_id|>user<|end_header_id|>
+{question}
+<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+"""
+
+
+def generate(
+    llm: BaseLLM, prompts: List[str], batch_size: int, max_new_tokens: int
+) -> Tuple[List[float], float, int]:
+    # Latency of every prompt, total seconds and generated tokens, with
+    # batch_size prompts per call.
+    kwargs = max_new_tokens_kwargs(llm, max_new_tokens)
+    latencies, seconds, generated_tokens = list(), 0.0, 0
+    for i in range(0, len(prompts), batch_size):
+        batch = prompts[i : i + batch_size]
+        start = time.perf_counter()
+        result = llm.generate(batch, **kwargs)
+        batch_seconds = time.perf_counter() - start
+        latencies += [batch_seconds] * len(batch)
+        seconds += batch_seconds
+        generated_tokens += sum(
+            count_tokens(llm, g[0].text) for g in result.generations
+        )
+    return latencies, seconds, generated_tokens
+
+
+def run(
+    backend: str,
+    model_path: Optional[str],
+    prompts: List[str],
+    max_new_tokens: int,
+    batch_size: int,
+):
+    start = time.perf_counter()
+    llm = load_local_model(backend=backend, model_path=model_path)
+    load_seconds = time.perf_counter() - start
+    # One untimed call so that one-off initialization is not counted.
+    llm.invoke(prompts[0], **max_new_tokens_kwargs(llm, 1))
+    prompt_tokens = sum(count_tokens(llm, p) for p in prompts)
+    print(
+        f"{backend}: loaded in {load_seconds:.1f}s, {len(prompts)} prompts, "
+        f"{prompt_tokens / len(prompts):.0f} prompt tokens per prompt"
+    )
+    for size in sorted({1, batch_size}):
+        latencies, seconds, generated_tokens = generate(
+            llm, prompts, size, max_new_tokens
+        )
+        print(
+            f"  batch size {size}: {generated_tokens / len(prompts):.0f} generated "
+            f"tokens per prompt, latency {np.mean(latencies):.2f}s "
+            f"(p95 {np.percentile(latencies, 95):.2f}s), "
+            f"{generated_tokens / seconds:.1f} tokens/s"
+        )
+    del llm
+    gc.collect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load time, latency and generated tokens/second of the local LLM backends, one prompt at a time and batched."
+    )
+    parser.add_argument(
+        "--backends", nargs="+", choices=LOCAL_LLM_BACKENDS, default=["llamacpp"]
+    )
+    parser.add_argument(
+        "--model-path",
+        help="Checkpoint to load instead of the configured one, e.g. a tiny GGUF or Hugging Face model to try a backend on a CPU box. Only used with a single backend.",
+    )
+    parser.add_argument("--num-prompts", type=int, default=len(example_questions))
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=const.llm_max_batch_size,
+        help="Also generate this many prompts per call, next to one at a time. Only the transformers backend batches them.",
+    )
+    args = parser.parse_args()
+    if args.model_path and len(args.backends) > 1:
+        parser.error("--model-path needs a single backend")
+
+    prompts = [
+        const.llama3_bos_token + _prompt_template.format(question=q)
+        for q in (example_questions * args.num_prompts)[: args.num_prompts]
+    ]
+    for backend in args.backends:
+        run(backend, args.model_path, prompts, args.max_new_tokens, args.batch_size)
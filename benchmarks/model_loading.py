@@ -0,0 +1,72 @@
+import argparse
+from typing import Dict
+
+from benchmarks.startup import report, run_in_fresh_interpreter
+
+# Each step is timed in the same fresh interpreter, in the order the app runs
+# them. The baseline is the previous loader: tokenizer resolved by hub name and
+# the checkpoint loaded with default from_pretrained settings.
+_load_code = """
+import json, time
+import torch
+import utils.constants as const
+from utils.huggingface_utils import load_local_causal_lm, load_local_tokenizer
+
+timings = dict()
+start = time.perf_counter()
+if {baseline}:
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    model = AutoModelForCausalLM.from_pretrained(
+        const.MODELS_PATH, trust_remote_code=True, device_map="auto"
+    )
+    timings["model"] = time.perf_counter() - start
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(const.local_model_to_be_quantised)
+else:
+    model = load_local_causal_lm()
+    timings["model"] = time.perf_counter() - start
+    start = time.perf_counter()
+    tokenizer = load_local_tokenizer()
+timings["tokenizer"] = time.perf_counter() - start
+timings["seconds"] = timings["model"] + timings["tokenizer"]
+if torch.cuda.is_available():
+    timings["gpu_gib"] = torch.cuda.max_memory_allocated() / 2**30
+print(json.dumps(timings))
+"""
+
+
+def load_time(baseline: bool, offline: bool) -> Dict:
+    return run_in_fresh_interpreter(
+        _load_code.format(baseline=baseline),
+        env={"HF_HUB_OFFLINE": "1", "TRANSFORMERS_OFFLINE": "1"} if offline else None,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cold load time of the local LLM checkpoint and its tokenizer from MODELS_PATH, each in a fresh interpreter."
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--offline",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Load with the Hugging Face Hub disabled, as on a machine without network.",
+    )
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="Also time the previous loader.",
+    )
+    args = parser.parse_args()
+
+    for name, baseline in [("local", False)] + (
+        [("baseline", True)] if args.baseline else []
+    ):
+        runs = [load_time(baseline, args.offline) for _ in range(args.repeats)]
+        report(name, runs)
+        for step in ["model", "tokenizer", "gpu_gib"]:
+            values = [r[step] for r in runs if step in r]
+            if values:
+                print(f"  {step}: {' '.join(f'{v:.2f}' for v in values)}")
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+import utils.cai_model as cai_model
+
+
+class FakeCompletionsHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI compatible /completions endpoint: answers every prompt after
+    a fixed latency and fails a share of the requests with a 503.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.2
+    failure_rate = 0.0
+    connections = set()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        with self.lock:
+            self.connections.add(self.client_address)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            self._send(503, {"error": {"message": "overloaded"}})
+            return
+        prompt = body["prompt"]
+        if isinstance(prompt, list):
+            self._send(400, {"error": {"message": "only one prompt per request"}})
+            return
+        self._send(
+            200,
+            {
+                "id": "cmpl-fake",
+                "object": "text_completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "text": f"answer to: {prompt[:20]}",
+                        "finish_reason": "stop",
+                        "logprobs": None,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": len(prompt.split()),
+                    "completion_tokens": 4,
+                    "total_tokens": len(prompt.split()) + 4,
+                },
+            },
+        )
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(latency: float, failure_rate: float) -> ThreadingHTTPServer:
+    FakeCompletionsHandler.latency = latency
+    FakeCompletionsHandler.failure_rate = failure_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(name: str, prompts: List[str], fn: Callable[[], List[str]]):
+    FakeCompletionsHandler.connections.clear()
+    start = time.perf_counter()
+    answers = fn()
+    seconds = time.perf_counter() - start
+    assert len(answers) == len(prompts)
+    print(
+        f"{name}: {len(prompts) / seconds:.1f} requests/s, {seconds:.2f}s for {len(prompts)} prompts, "
+        f"{len(FakeCompletionsHandler.connections)} connections"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Throughput of the pooled remote LLM client against a local fake OpenAI compatible server."
+    )
+    parser.add_argument("--num-prompts", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.1,
+        help="Share of requests the fake server fails with a 503, retried by the client.",
+    )
+    args = parser.parse_args()
+
+    server = start_fake_server(args.latency, args.failure_rate)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    prompts = [f"question {i} about retrieval" for i in range(args.num_prompts)]
+
+    def get_llm():
+        return cai_model.getCAIHostedOpenAIModels(
+            base_url=base_url, model="fake", api_key="fake", max_tokens=16
+        )
+
+    # A new model per question, as the app used to build one per question.
+    timed(
+        "sequential, new model per prompt",
+        prompts,
+        lambda: [
+            cai_model.CAIHostedOpenAI(
+                base_url=base_url,
+                model="fake",
+                api_key="fake",
+                max_tokens=16,
+                pool=cai_model.EndpointPool(1, 1, 60.0),
+            ).invoke(p)
+            for p in prompts
+        ],
+    )
+    timed(
+        "sequential, cached model",
+        prompts,
+        lambda: [get_llm().invoke(p) for p in prompts],
+    )
+    timed("batch", prompts, lambda: get_llm().batch(prompts))
+    timed(
+        "async",
+        prompts,
+        lambda: asyncio.run(get_llm().abatch(prompts)),
+    )
+    # Every Streamlit rerun runs its own event loop.
+    timed(
+        "async, second event loop",
+        prompts,
+        lambda: asyncio.run(get_llm().abatch(prompts)),
+    )
+    print(f"The cached model is reused: {get_llm() is get_llm()}")
+    server.shutdown()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "streamlit",
+    "utils.neo4j_utils",
+    "utils.huggingface_utils",
+    "streamlit_pages.commons",
+    "utils.retriever_utils",
+    "utils.knowledge_graph_rag",
+]
+
+PAGES = [
+    "streamlit_pages/rag_app_page.py",
+    "streamlit_pages/model_selection_page.py",
+    "streamlit_pages/knowledge_graph_visualisation_page.py",
+]
+
+
+def run_in_fresh_interpreter(code: str, env: Optional[Dict[str, str]] = None) -> Dict:
+    # Every measurement gets its own interpreter, so that nothing is already
+    # imported or cached by st.cache_resource.
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT, **(env or {})},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_time(module: str) -> Dict:
+    return run_in_fresh_interpreter(
+        f"""
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+    )
+
+
+def first_render_time(page: str, timeout: float) -> Dict:
+    # AppTest runs the page script once, as for the first visit of a user, and
+    # returns when the script has finished rendering.
+    return run_in_fresh_interpreter(
+        f"""
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({os.path.join(ROOT, page)!r}, default_timeout={timeout})
+app.run()
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "headers": [h.value for h in app.header],
+    "exceptions": [e.message for e in app.exception],
+}}))
+"""
+    )
+
+
+def report(name: str, runs: List[Dict]):
+    errors = [r["error"] for r in runs if "error" in r]
+    if errors:
+        print(f"{name}: failed, {errors[0]}")
+        return
+    seconds = sorted(r["seconds"] for r in runs)
+    line = f"{name}: median {seconds[len(seconds) // 2]:.2f}s, min {seconds[0]:.2f}s, max {seconds[-1]:.2f}s"
+    exceptions = runs[-1].get("exceptions")
+    if exceptions:
+        line += f", raised {exceptions[0]}"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import time of the app modules and time to first render of every page, each in a fresh interpreter."
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="Seconds a page may take to render, model loads included.",
+    )
+    parser.add_argument("--skip-pages", action="store_true")
+    args = parser.parse_args()
+
+    print("Import time")
+    for module in MODULES:
+        report(module, [import_time(module) for _ in range(args.repeats)])
+    if args.skip_pages:
+        raise SystemExit(0)
+    print("Time to first render")
+    for page in PAGES:
+        report(
+            page, [first_render_time(page, args.timeout) for _ in range(args.repeats)]
+        )
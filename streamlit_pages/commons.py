@@ -1,39 +1,149 @@
 import gc
-import time
 from enum import Enum
+from typing import List
 
 import streamlit as st
-import torch
+from langchain.graphs import Neo4jGraph
+from langchain_core.embeddings import Embeddings
 from langchain_core.language_models.llms import BaseLLM
 
 import utils.constants as const
-from utils.huggingface_utils import cache_and_load_embedding_model, load_local_model
+from utils.huggingface_utils import (
+    load_local_model,
+    load_query_embedding_model,
+    max_new_tokens_kwargs,
+    resolve_local_llm_backend,
+)
+from utils.llm_batching_utils import BatchingLLM, GenerationScheduler
+from utils.neo4j_utils import (
+    get_neo4j_credentails,
+    is_neo4j_server_up,
+    reset_neo4j_server,
+    wait_for_neo4j_server,
+)
+from utils.warmup_utils import WarmupService
 
 
-@st.cache_resource(show_spinner=False)
-def get_cached_local_model() -> BaseLLM:
-    progress_bar = st.progress(0, "Running garbage collection.")
+def connect_to_neo4j() -> Neo4jGraph:
+    if not is_neo4j_server_up():
+        reset_neo4j_server()
+        wait_for_neo4j_server()
+    return Neo4jGraph(
+        username=get_neo4j_credentails()["username"],
+        password=get_neo4j_credentails()["password"],
+        url=get_neo4j_credentails()["uri"],
+    )
+
+
+def load_local_model_after_gc() -> BaseLLM:
+    import torch
+
     gc.collect()
-    progress_bar.progress(30, "Emptying CUDA cache.")
     with torch.no_grad():
         torch.cuda.empty_cache()
-    progress_bar.progress(
-        60, f"Loading local {const.local_model_to_be_quantised} model."
+    # All sessions share the local LLM, their prompts are batched together.
+    # llama.cpp generates one prompt at a time.
+    max_batch_size = (
+        const.llm_max_batch_size if resolve_local_llm_backend() == "transformers" else 1
+    )
+    return BatchingLLM(
+        scheduler=GenerationScheduler(
+            load_local_model(), max_batch_size, const.llm_batch_wait_ms / 1000
+        )
     )
-    local_llm = load_local_model()
-    progress_bar.progress(99, "Model loaded successfully.")
-    time.sleep(1.0)
-    progress_bar.empty()
-    return local_llm
+
+
+def load_colbert_model():
+    from utils.retriever_utils import get_colbert_model
+
+    return get_colbert_model()
+
+
+_warmup_loaders = {
+    "neo4j": (connect_to_neo4j, lambda graph: graph.query("RETURN 1")),
+    "embedding": (
+        load_query_embedding_model,
+        lambda embedding: embedding.embed_query("warm up"),
+    ),
+    "local_llm": (
+        load_local_model_after_gc,
+        lambda llm: llm.invoke(
+            const.llama3_bos_token + "Hello", **max_new_tokens_kwargs(llm, 1)
+        ),
+    ),
+    "colbert": (
+        load_colbert_model,
+        lambda model: model.rerank(query="warm up", documents=["warm up"], k=1),
+    ),
+}
+
+
+def launch_warmup_components() -> List[str]:
+    # The local LLM is only warmed up once a session uses it, see
+    # warm_up_session_llm.
+    components = [n for n in const.warmup_components if n != "local_llm"]
+    if const.adaptive_rerank:
+        # The rerank gate can skip ColBERT entirely, it loads on first use.
+        components = [n for n in components if n != "colbert"]
+    return components
 
 
 @st.cache_resource(show_spinner=False)
-def get_cached_embedding_model():
-    progress_bar = st.progress(20, f"Loading {const.embed_model_name} embedding model.")
-    embedding = cache_and_load_embedding_model()
-    progress_bar.progress(100, "Model loaded successfully.")
-    progress_bar.empty()
-    return embedding
+def get_warmup_service() -> WarmupService:
+    # Started by the first script run of the app process, shared by all sessions.
+    # Components left out are loaded by their first get.
+    service = WarmupService()
+    for name, loaders in _warmup_loaders.items():
+        service.add(name, *loaders)
+    return service.start(launch_warmup_components())
+
+
+def warm_up_session_llm():
+    # Sessions on the local LLM, the default, warm it up, remote LLM sessions
+    # never load it.
+    if "local_llm" in const.warmup_components and not st.session_state.get(
+        StateVariables.IS_REMOTE_LLM.value, False
+    ):
+        get_warmup_service().start(["local_llm"])
+
+
+def show_warmup_status(container=st):
+    warmup = get_warmup_service()
+    lines = [f"Warm-up started {warmup.elapsed_seconds:.0f}s ago"]
+    for name, s in warmup.status().items():
+        if s["state"] == "ready":
+            lines.append(
+                f":green[{name}] ready in {s['load_seconds']:.1f}s, probe {s['probe_seconds'] or 0:.2f}s"
+            )
+        elif s["state"] == "failed":
+            lines.append(f":red[{name}] failed: {s['error']}")
+        elif s["state"] == "pending":
+            lines.append(f":gray[{name}] not used yet")
+        else:
+            lines.append(f":orange[{name}] {s['state']}")
+    if warmup.is_ready("local_llm"):
+        metrics = warmup.get("local_llm").scheduler.metrics()
+        lines.append(
+            f"local_llm queue depth {metrics['queue_depth']}, "
+            f"mean batch size {metrics['mean_batch_size']:.1f}, "
+            f"mean wait {metrics['mean_wait_ms']:.0f} ms"
+        )
+    container.caption("  \n".join(lines))
+
+
+def get_cached_local_model() -> BaseLLM:
+    with st.spinner(f"Loading local {const.local_model_to_be_quantised} model."):
+        return get_warmup_service().get("local_llm")
+
+
+def get_cached_embedding_model() -> Embeddings:
+    with st.spinner(f"Loading {const.embed_model_name} embedding model."):
+        return get_warmup_service().get("embedding")
+
+
+def get_graph() -> Neo4jGraph:
+    with st.spinner("Spinning up the Neo4j server..."):
+        return get_warmup_service().get("neo4j")
 
 
 class StateVariables(Enum):
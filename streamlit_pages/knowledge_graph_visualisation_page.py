@@ -6,22 +6,10 @@ import streamlit.components.v1 as components
 from langchain.graphs import Neo4jGraph
 from pyvis.network import Network
 
+import streamlit_pages.commons as st_commons
 import utils.constants as const
-from utils.neo4j_utils import (
-    get_neo4j_credentails,
-    is_neo4j_server_up,
-    wait_for_neo4j_server,
-)
-
-with st.spinner("Spinning up the Neo4j server..."):
-    if not is_neo4j_server_up():
-        wait_for_neo4j_server()
-
-    graph = Neo4jGraph(
-        username=get_neo4j_credentails()["username"],
-        password=get_neo4j_credentails()["password"],
-        url=get_neo4j_credentails()["uri"],
-    )
+
+graph = st_commons.get_graph()
 
 
 def _get_all_papers(graphDbInstance: Neo4jGraph):
@@ -1,5 +1,5 @@
 import logging
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 
 import streamlit as st
 import streamlit.components.v1 as components
@@ -18,41 +18,33 @@ from utils.arxiv_utils import (
 )
 from utils.cai_model import getCAIHostedOpenAIModels
 from utils.knowledge_graph_rag import KnowledgeGraphRAG
-from utils.neo4j_utils import (
-    get_neo4j_credentails,
-    is_neo4j_server_up,
-    wait_for_neo4j_server,
-)
+from utils.neo4j_utils import get_neo4j_credentails
 from utils.vanilla_rag import VanillaRAG
 
-embedding = st_commons.get_cached_embedding_model()
-
 st.header("Knowledge Graph powered RAG")
 st.subheader(
     "A subset of AI/ML papers from :blue[_arXiv_] have been curated and pre-loaded into the knowledge base to answer your questions."
 )
 
 if st_commons.StateVariables.IS_REMOTE_LLM.value not in st.session_state:
-    # Default to local LLM in case of no selection.
-    st_commons.get_cached_local_model()
+    # Default to local LLM in case of no selection, the warm-up loads it.
     st.session_state[st_commons.StateVariables.IS_REMOTE_LLM.value] = False
 
-with st.spinner("Spinning up the Neo4j server..."):
-    if not is_neo4j_server_up():
-        wait_for_neo4j_server()
+# Models and Neo4j are warmed up in the background, the page only waits for
+# them once a question is submitted.
+if not st_commons.get_warmup_service().is_ready():
+    st_commons.show_warmup_status()
 
-    graph = Neo4jGraph(
-        username=get_neo4j_credentails()["username"],
-        password=get_neo4j_credentails()["password"],
-        url=get_neo4j_credentails()["uri"],
-    )
 
+def connect_document_index() -> Tuple[Neo4jGraph, Neo4jVector]:
+    graph = st_commons.get_graph()
     document_index = Neo4jVector(
-        embedding=embedding,
+        embedding=st_commons.get_cached_embedding_model(),
         url=get_neo4j_credentails()["uri"],
         username=get_neo4j_credentails()["username"],
         password=get_neo4j_credentails()["password"],
     )
+    return graph, document_index
 
 
 def load_llm() -> Tuple[BaseLLM, str]:
@@ -67,7 +59,6 @@ def load_llm() -> Tuple[BaseLLM, str]:
             ],
             max_tokens=2048,
             temperature=const.llm_temperture,
-            stop=const.llama3_stop_token,
         )
         return remote_llm, const.llama3_bos_token
     else:
@@ -94,6 +85,14 @@ def format_context(paper_chunks: List[PaperChunk]):
             st.markdown("\n\n".join(val["chunks"]))
 
 
+def format_context_stats(stats: Dict[str, Any]) -> str:
+    return (
+        f"Prompt of {stats['prompt_tokens']} tokens with "
+        f"{stats['packed_chunks']}/{stats['retrieved_chunks']} chunks "
+        f"from {stats['papers']} papers"
+    )
+
+
 def generate_responses_v2(input_text):
     status_container = st.container()
     kg_col, vanilla_col = st.columns([0.65, 0.35], gap="small")
@@ -133,6 +132,8 @@ def generate_responses_v2(input_text):
     vanilla_answer_container = vanilla_col.container(height=250, border=False)
 
     with status_container.status("Generating Responses...", expanded=True) as status:
+        status.write("Connecting to the knowledge graph...")
+        graph, document_index = connect_document_index()
         status.write("Loading the LLM model...")
         llm, bos_token = load_llm()
         # since remote model is more powerful.
@@ -156,6 +157,7 @@ def generate_responses_v2(input_text):
             a for ax in [pc.paper.authors for pc in kg_chunks_used] for a in ax
         ]
         answer_kg = k.invoke(input_text)
+        kg_context_expander.caption(format_context_stats(k.context_stats))
         papers_used_in_kg_answer = k.used_papers
         kg_answer_container.markdown(linkify_arxiv_ids(answer_kg))
         kg_col.markdown("---")
@@ -192,6 +194,7 @@ def generate_responses_v2(input_text):
         with vanilla_context_expander:
             format_context(vanilla_chunks_used)
         answer_vanilla = v.invoke(input_text)
+        vanilla_context_expander.caption(format_context_stats(v.context_stats))
         vanilla_answer_container.markdown(linkify_arxiv_ids(answer_vanilla))
         vanilla_col.markdown("---")
 
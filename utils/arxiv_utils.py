@@ -126,12 +126,16 @@ def extract_pdf_link_from_result(res: arxiv.Result):
     raise ValueError("No PDF link found in the result.")
 
 
-def convert_pdf_link_to_text(pdf_link: str):
+def download_pdf(pdf_link: str) -> bytes:
     headers = {
         "User-Agent": "Mozilla/5.0 (X11; Windows; Windows x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.5060.114 Safari/537.36"
     }
     response = requests.get(url=pdf_link, headers=headers, timeout=120)
-    on_fly_mem_obj = io.BytesIO(response.content)
+    return response.content
+
+
+def convert_pdf_bytes_to_text(content: bytes) -> str:
+    on_fly_mem_obj = io.BytesIO(content)
     pdf_file = PdfReader(on_fly_mem_obj)
     text = ""
     for page in pdf_file.pages:
@@ -139,6 +143,10 @@ def convert_pdf_link_to_text(pdf_link: str):
     return text
 
 
+def convert_pdf_link_to_text(pdf_link: str):
+    return convert_pdf_bytes_to_text(download_pdf(pdf_link))
+
+
 def get_cited_arxiv_papers_from_paper_text(
     original_paper: arxiv.Result, text: str
 ) -> List[str]:
@@ -154,12 +162,15 @@ def get_cited_arxiv_papers_from_paper_text(
     return arxiv_ids
 
 
-def create_paper_object_from_arxiv_id(arxivId: str) -> IngestablePaper:
+def fetch_arxiv_result(arxivId: str) -> arxiv.Result:
     client = arxiv.Client()
     itr = client.results(arxiv.Search(id_list=[arxivId]))
-    result = next(itr)
-    pdf_link = extract_pdf_link_from_result(result)
-    full_text = convert_pdf_link_to_text(pdf_link)
+    return next(itr)
+
+
+def create_paper_object_from_arxiv_result(
+    result: arxiv.Result, full_text: str
+) -> IngestablePaper:
     cited_arxiv_papers = get_cited_arxiv_papers_from_paper_text(result, full_text)
     return IngestablePaper(
         arxiv_id=re.findall(r"\d{4}\.\d{4,5}", result.entry_id)[0],
@@ -168,13 +179,20 @@ def create_paper_object_from_arxiv_id(arxivId: str) -> IngestablePaper:
         summary=result.summary,
         authors=[a.name for a in result.authors],
         categories=result.categories,
-        pdf_link=pdf_link,
+        pdf_link=extract_pdf_link_from_result(result),
         published_date=result.published.date(),
         full_text=full_text,
         cited_arxiv_papers=cited_arxiv_papers,
     )
 
 
+def create_paper_object_from_arxiv_id(arxivId: str) -> IngestablePaper:
+    result = fetch_arxiv_result(arxivId)
+    pdf_link = extract_pdf_link_from_result(result)
+    full_text = convert_pdf_link_to_text(pdf_link)
+    return create_paper_object_from_arxiv_result(result, full_text)
+
+
 def linkify_authors(text: str, authors: List[str]) -> str:
     authors = list(set(authors))
     new_text = text
@@ -0,0 +1,251 @@
+import csv
+import gzip
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from langchain.docstore.document import Document
+
+from utils.arxiv_utils import IngestablePaper
+from utils.data_utils import create_chunk_id
+
+# File name -> (import argument, label or relationship type, header)
+# The headers follow the `neo4j-admin database import` CSV header format, arrays
+# use the default ";" delimiter.
+NODE_FILES = {
+    "categories.csv.gz": (
+        "nodes",
+        "Category",
+        ["code:ID(Category)", "title", "description"],
+    ),
+    "papers.csv.gz": (
+        "nodes",
+        "Paper",
+        [
+            "id:ID(Paper)",
+            "title",
+            "summary",
+            "published:date",
+            "arxiv_link",
+            "pdf_link",
+            "cited_arxiv_papers:string[]",
+        ],
+    ),
+    "authors.csv.gz": ("nodes", "Author", ["name:ID(Author)"]),
+    "chunks.csv.gz": (
+        "nodes",
+        "Chunk",
+        ["id:ID(Chunk)", "text", "arxiv_id", "embedding:float[]"],
+    ),
+}
+RELATIONSHIP_FILES = {
+    "cites.csv.gz": ("relationships", "CITES", [":START_ID(Paper)", ":END_ID(Paper)"]),
+    "authored_by.csv.gz": (
+        "relationships",
+        "AUTHORED_BY",
+        [":START_ID(Paper)", ":END_ID(Author)"],
+    ),
+    "belongs_to_category.csv.gz": (
+        "relationships",
+        "BELONGS_TO_CATEGORY",
+        [":START_ID(Paper)", ":END_ID(Category)"],
+    ),
+    "contains_text.csv.gz": (
+        "relationships",
+        "CONTAINS_TEXT",
+        [":START_ID(Paper)", ":END_ID(Chunk)"],
+    ),
+}
+ARRAY_DELIMITER = ";"
+
+
+def _strip_array_delimiter(values: Iterable[str]) -> List[str]:
+    return [str(v).replace(ARRAY_DELIMITER, ",") for v in values]
+
+
+class BulkImportExporter:
+    """
+    Streams the knowledge graph into gzipped CSV files that
+    `neo4j-admin database import full` can load directly into an empty database.
+    Rows are written as they arrive, only node IDs are kept in memory to
+    de-duplicate authors, categories and chunks.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self._files = dict()
+        self._writers = dict()
+        for file_name, (_, _, header) in {**NODE_FILES, **RELATIONSHIP_FILES}.items():
+            f = gzip.open(
+                os.path.join(output_dir, file_name), "wt", encoding="utf-8", newline=""
+            )
+            self._files[file_name] = f
+            self._writers[file_name] = csv.writer(f)
+            self._writers[file_name].writerow(header)
+        self._category_codes: Set[str] = set()
+        self._referenced_category_codes: Set[str] = set()
+        self._author_names: Set[str] = set()
+        self._chunk_ids: Set[str] = set()
+        self.counts = {file_name: 0 for file_name in self._files}
+
+    def __enter__(self) -> "BulkImportExporter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, file_name: str, row: List):
+        self._writers[file_name].writerow(row)
+        self.counts[file_name] += 1
+
+    def add_categories(self, categories: List[Dict[str, str]]):
+        for c in categories:
+            if c["code"] in self._category_codes:
+                continue
+            self._category_codes.add(c["code"])
+            self._write("categories.csv.gz", [c["code"], c["title"], c["description"]])
+
+    def add_papers(self, papers: List[IngestablePaper]):
+        for p in papers:
+            self._write(
+                "papers.csv.gz",
+                [
+                    p.arxiv_id,
+                    p.title,
+                    p.summary,
+                    p.published_date.strftime("%Y-%m-%d"),
+                    p.arxiv_link,
+                    p.pdf_link,
+                    ARRAY_DELIMITER.join(p.cited_arxiv_papers),
+                ],
+            )
+            for author in set(_strip_array_delimiter(p.authors)):
+                if author not in self._author_names:
+                    self._author_names.add(author)
+                    self._write("authors.csv.gz", [author])
+                self._write("authored_by.csv.gz", [p.arxiv_id, author])
+            for code in set(p.categories):
+                self._referenced_category_codes.add(code)
+                self._write("belongs_to_category.csv.gz", [p.arxiv_id, code])
+
+    def add_chunks(self, embedded_chunks: List[Tuple[Document, List[float]]]):
+        for doc, vector in embedded_chunks:
+            arxiv_id = doc.metadata["arxiv_id"]
+            chunk_id = create_chunk_id(arxiv_id, doc.page_content)
+            if chunk_id in self._chunk_ids:
+                continue
+            self._chunk_ids.add(chunk_id)
+            self._write(
+                "chunks.csv.gz",
+                [
+                    chunk_id,
+                    doc.page_content,
+                    arxiv_id,
+                    ARRAY_DELIMITER.join(repr(float(v)) for v in vector),
+                ],
+            )
+            self._write("contains_text.csv.gz", [arxiv_id, chunk_id])
+
+    def add_chunk_links(self, pairs: List[Tuple[str, str]]):
+        # Extra papers of an exported chunk, e.g. of near duplicates dropped
+        # before embedding.
+        for arxiv_id, chunk_id in sorted(set(pairs)):
+            if chunk_id in self._chunk_ids:
+                self._write("contains_text.csv.gz", [arxiv_id, chunk_id])
+
+    def add_citations(self, pairs: List[Tuple[str, str]]):
+        for citing, cited in pairs:
+            self._write("cites.csv.gz", [citing, cited])
+
+    def close(self):
+        # Papers may belong to categories missing from the taxonomy, the
+        # transactional build MERGEs those, so export them as bare nodes.
+        self.add_categories(
+            [
+                {"code": code, "title": "", "description": ""}
+                for code in sorted(self._referenced_category_codes)
+            ]
+        )
+        for f in self._files.values():
+            f.close()
+        with open(os.path.join(self.output_dir, "import.sh"), "w") as f:
+            f.write(create_bulk_import_command(os.path.abspath(self.output_dir)))
+            f.write("\n")
+
+
+def create_bulk_import_command(
+    import_dir: str, database: str = "neo4j", neo4j_admin: str = "neo4j-admin"
+) -> str:
+    args = [
+        f"{neo4j_admin} database import full {database}",
+        "--overwrite-destination=true",
+        "--multiline-fields=true",
+        f"--array-delimiter='{ARRAY_DELIMITER}'",
+    ]
+    for file_name, (kind, name, _) in {**NODE_FILES, **RELATIONSHIP_FILES}.items():
+        args.append(f"--{kind}={name}={os.path.join(import_dir, file_name)}")
+    return " \\\n  ".join(args)
+
+
+def _read_rows(path: str) -> Iterator[List[str]]:
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        yield from csv.reader(f)
+
+
+def validate_bulk_import_files(import_dir: str) -> List[str]:
+    errors = list()
+    node_ids: Dict[str, Set[str]] = dict()
+    embedding_dimension: Optional[int] = None
+
+    for file_name, (_, label, header) in NODE_FILES.items():
+        path = os.path.join(import_dir, file_name)
+        if not os.path.exists(path):
+            errors.append(f"{file_name}: missing")
+            continue
+        rows = _read_rows(path)
+        if next(rows, None) != header:
+            errors.append(f"{file_name}: unexpected header")
+            continue
+        ids = node_ids.setdefault(label, set())
+        for line, row in enumerate(rows, start=2):
+            if len(row) != len(header):
+                errors.append(f"{file_name}:{line}: expected {len(header)} columns")
+                continue
+            if not row[0]:
+                errors.append(f"{file_name}:{line}: empty ID")
+            if row[0] in ids:
+                errors.append(f"{file_name}:{line}: duplicate ID {row[0]}")
+            ids.add(row[0])
+            if label == "Chunk":
+                try:
+                    dimension = len([float(v) for v in row[3].split(ARRAY_DELIMITER)])
+                except ValueError:
+                    errors.append(f"{file_name}:{line}: invalid embedding")
+                    continue
+                if embedding_dimension is None:
+                    embedding_dimension = dimension
+                elif dimension != embedding_dimension:
+                    errors.append(
+                        f"{file_name}:{line}: embedding has {dimension} dimensions, expected {embedding_dimension}"
+                    )
+
+    for file_name, (_, _, header) in RELATIONSHIP_FILES.items():
+        path = os.path.join(import_dir, file_name)
+        if not os.path.exists(path):
+            errors.append(f"{file_name}: missing")
+            continue
+        rows = _read_rows(path)
+        if next(rows, None) != header:
+            errors.append(f"{file_name}: unexpected header")
+            continue
+        start_label = header[0][len(":START_ID(") : -1]
+        end_label = header[1][len(":END_ID(") : -1]
+        for line, row in enumerate(rows, start=2):
+            if len(row) != 2:
+                errors.append(f"{file_name}:{line}: expected 2 columns")
+                continue
+            if row[0] not in node_ids.get(start_label, set()):
+                errors.append(f"{file_name}:{line}: unknown {start_label} {row[0]}")
+            if row[1] not in node_ids.get(end_label, set()):
+                errors.append(f"{file_name}:{line}: unknown {end_label} {row[1]}")
+    return errors
@@ -1,9 +1,93 @@
-from typing import Any, Dict
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
+import httpx
+import openai
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.outputs import LLMResult
 from langchain_openai import OpenAI
 
+import utils.constants as const
+
+# Errors worth another attempt, anything else (bad request, authentication) is
+# raised straight away.
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def backoff_seconds(attempt: int) -> float:
+    # Full jitter, so that clients that failed together do not retry together.
+    return random.uniform(
+        0,
+        min(
+            const.remote_llm_max_backoff_seconds,
+            const.remote_llm_backoff_seconds * 2**attempt,
+        ),
+    )
+
+
+class EndpointPool:
+    """
+    Keep-alive HTTP connection pools and concurrency limits shared by every
+    model served from one endpoint.
+    """
+
+    def __init__(self, max_connections: int, max_concurrency: int, timeout: float):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.timeout = httpx.Timeout(
+            timeout, connect=const.remote_llm_connect_timeout_seconds
+        )
+        self.http_client = httpx.Client(limits=self.limits, timeout=self.timeout)
+        self.max_concurrency = max_concurrency
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="remote-llm"
+        )
+
+
+_pools: Dict[str, EndpointPool] = dict()
+_models: Dict[str, "CAIHostedOpenAI"] = dict()
+_cache_lock = threading.Lock()
+
+
+def get_endpoint_pool(base_url: str) -> EndpointPool:
+    with _cache_lock:
+        if base_url not in _pools:
+            _pools[base_url] = EndpointPool(
+                max_connections=const.remote_llm_max_connections,
+                max_concurrency=const.remote_llm_max_concurrency,
+                timeout=const.remote_llm_timeout_seconds,
+            )
+        return _pools[base_url]
+
 
 class CAIHostedOpenAI(OpenAI):
+    """
+    OpenAI compatible completions model that sends one request per prompt,
+    concurrently up to the limit of its endpoint, with timeouts and retries
+    with jittered backoff.
+    """
+
+    pool: EndpointPool
+
+    class Config:
+        arbitrary_types_allowed = True
+
     @property
     def _default_params(self) -> Dict[str, Any]:
         """Get the default parameters for calling OpenAI API."""
@@ -25,20 +109,131 @@ class CAIHostedOpenAI(OpenAI):
 
         return {**normal_params, **self.model_kwargs}
 
+    def _complete(self, prompt: str, params: Dict[str, Any]) -> Dict:
+        # Endpoints such as Cloudera AI Inference only accept a single prompt.
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.pool.semaphore:
+                    return self.client.create(prompt=prompt, **params).model_dump()
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+            time.sleep(backoff_seconds(attempt))
+
+    def _async_completions(
+        self, http_client: httpx.AsyncClient
+    ) -> openai.resources.AsyncCompletions:
+        return openai.AsyncOpenAI(
+            http_client=http_client,
+            api_key=(
+                self.openai_api_key.get_secret_value() if self.openai_api_key else None
+            ),
+            base_url=self.openai_api_base,
+            timeout=self.pool.timeout,
+            max_retries=0,
+        ).completions
+
+    async def _acomplete(
+        self,
+        client: openai.resources.AsyncCompletions,
+        semaphore: asyncio.Semaphore,
+        prompt: str,
+        params: Dict[str, Any],
+    ) -> Dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    response = await client.create(prompt=prompt, **params)
+                    return response.model_dump()
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(backoff_seconds(attempt))
+
+    def _llm_result(
+        self, responses: List[Dict], prompts: List[str], params: Dict[str, Any]
+    ) -> LLMResult:
+        choices, token_usage = list(), dict()
+        for response in responses:
+            choices.extend(response["choices"])
+            for key, value in (response.get("usage") or {}).items():
+                if isinstance(value, int):
+                    token_usage[key] = token_usage.get(key, 0) + value
+        return self.create_llm_result(choices, prompts, params, token_usage)
+
+    def _params(self, prompts: List[str], stop: Optional[List[str]], **kwargs):
+        params = {**self._invocation_params, **kwargs}
+        # Sets the stop sequences and resolves max_tokens=-1 in params.
+        self.get_sub_prompts(params, prompts, stop)
+        return params
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        params = self._params(prompts, stop, **kwargs)
+        if len(prompts) == 1:
+            responses = [self._complete(prompts[0], params)]
+        else:
+            responses = list(
+                self.pool.executor.map(lambda p: self._complete(p, params), prompts)
+            )
+        return self._llm_result(responses, prompts, params)
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        params = self._params(prompts, stop, **kwargs)
+        # Async connections and semaphores belong to the event loop that
+        # created them, e.g. every asyncio.run of a Streamlit rerun, so each
+        # call opens its own and closes them before the loop goes away.
+        semaphore = asyncio.Semaphore(self.pool.max_concurrency)
+        async with httpx.AsyncClient(
+            limits=self.pool.limits, timeout=self.pool.timeout
+        ) as http_client:
+            client = self._async_completions(http_client)
+            responses = await asyncio.gather(
+                *[self._acomplete(client, semaphore, p, params) for p in prompts]
+            )
+        return self._llm_result(list(responses), prompts, params)
+
 
 def getCAIHostedOpenAIModels(
     base_url: str, model: str, api_key: str, max_tokens: int = 1024, **kwargs
 ) -> CAIHostedOpenAI:
+    # One model per endpoint, model, key and settings, all models of an
+    # endpoint share its connection pool and concurrency limit.
+    key = json.dumps(
+        [base_url, model, api_key, max_tokens, kwargs], sort_keys=True, default=str
+    )
+    with _cache_lock:
+        if key in _models:
+            return _models[key]
+    pool = get_endpoint_pool(base_url)
+    # Retries are done by the model with jittered backoff, not by the clients.
+    # Async calls build their client per event loop, see _async_completions.
     m = CAIHostedOpenAI(
         base_url=base_url,
         model=model,
         api_key=api_key,
         max_tokens=max_tokens,
+        pool=pool,
+        client=openai.OpenAI(
+            http_client=pool.http_client,
+            api_key=api_key,
+            base_url=base_url,
+            timeout=pool.timeout,
+            max_retries=0,
+        ).completions,
+        max_retries=const.remote_llm_max_retries,
         **kwargs,
     )
-    old_create = m.client.create
-    m.client.create = lambda prompt, **params: old_create(
-        prompt=prompt[0] if isinstance(prompt, list) else prompt, **params
-    )
-
-    return m
+    with _cache_lock:
+        return _models.setdefault(key, m)
@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import pickle
+import shutil
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from utils.arxiv_utils import IngestablePaper
+
+# Per paper stages of the build job, in the order they complete. Citations are
+# linked once every paper has been embedded.
+BUILD_STAGES = ["fetched", "extracted", "inserted", "chunked", "embedded", "cited"]
+
+
+class BuildManifest:
+    """
+    Durable record of the build job's progress, kept on the project volume so
+    that a rerun after a crash or eviction resumes where the last run stopped.
+
+    Progress is an append-only JSON lines log, every record is flushed and
+    fsync'ed before the caller moves on. Fetched PDFs and extracted paper texts
+    are cached next to it so resumed runs do not go back to arXiv.
+    """
+
+    _log_file = "manifest.jsonl"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._fetched_dir = os.path.join(directory, "fetched")
+        self._extracted_dir = os.path.join(directory, "extracted")
+        for d in (self.directory, self._fetched_dir, self._extracted_dir):
+            os.makedirs(d, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Set[str]] = {s: set() for s in BUILD_STAGES}
+        self._values: Dict[str, Any] = dict()
+        self._load()
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.directory, self._log_file)
+
+    def _apply(self, record: Dict):
+        if record["type"] == "stage":
+            self._stages[record["stage"]].update(record["ids"])
+        elif record["type"] == "value":
+            self._values[record["key"]] = record["value"]
+
+    def _load(self):
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write, the record was
+                    # never acknowledged so it is safe to drop.
+                    continue
+                self._apply(record)
+
+    def _append(self, record: Dict):
+        with self._lock:
+            with open(self._log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(record)
+
+    def _rewrite(self):
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for key, value in self._values.items():
+                f.write(json.dumps({"type": "value", "key": key, "value": value}))
+                f.write("\n")
+            for stage, ids in self._stages.items():
+                if ids:
+                    record = {"type": "stage", "stage": stage, "ids": sorted(ids)}
+                    f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._log_path)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._values and not any(self._stages.values())
+
+    def is_done(self, stage: str, arxiv_id: str) -> bool:
+        return arxiv_id in self._stages[stage]
+
+    def done(self, stage: str) -> Set[str]:
+        return set(self._stages[stage])
+
+    def mark(self, stage: str, arxiv_ids: Iterable[str]):
+        arxiv_ids = [i for i in arxiv_ids if i not in self._stages[stage]]
+        if arxiv_ids:
+            self._append({"type": "stage", "stage": stage, "ids": arxiv_ids})
+
+    def get_value(self, key: str, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def set_value(self, key: str, value: Any):
+        self._append({"type": "value", "key": key, "value": value})
+
+    def reset_from(self, stage: str):
+        with self._lock:
+            for s in BUILD_STAGES[BUILD_STAGES.index(stage) :]:
+                self._stages[s] = set()
+            self._rewrite()
+        if BUILD_STAGES.index(stage) <= BUILD_STAGES.index("extracted"):
+            shutil.rmtree(self._extracted_dir, ignore_errors=True)
+            os.makedirs(self._extracted_dir, exist_ok=True)
+        if stage == "fetched":
+            shutil.rmtree(self._fetched_dir, ignore_errors=True)
+            os.makedirs(self._fetched_dir, exist_ok=True)
+
+    def clear(self):
+        with self._lock:
+            self._stages = {s: set() for s in BUILD_STAGES}
+            self._values = dict()
+            self._rewrite()
+        self.reset_from("fetched")
+
+    def _write_atomically(self, path: str, content: bytes):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def save_fetched(self, arxiv_id: str, result: Any, pdf_content: bytes):
+        self._write_atomically(
+            os.path.join(self._fetched_dir, f"{arxiv_id}.pkl"),
+            pickle.dumps((result, pdf_content)),
+        )
+        self.mark("fetched", [arxiv_id])
+
+    def load_fetched(self, arxiv_id: str) -> Optional[Tuple[Any, bytes]]:
+        path = os.path.join(self._fetched_dir, f"{arxiv_id}.pkl")
+        if not self.is_done("fetched", arxiv_id) or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def save_extracted(self, requested_arxiv_id: str, paper: IngestablePaper):
+        content = {
+            "arxiv_id": paper.arxiv_id,
+            "arxiv_link": paper.arxiv_link,
+            "title": paper.title,
+            "summary": paper.summary,
+            "authors": paper.authors,
+            "categories": paper.categories,
+            "pdf_link": paper.pdf_link,
+            "published_date": paper.published_date.isoformat(),
+            "full_text": paper.full_text,
+            "cited_arxiv_papers": paper.cited_arxiv_papers,
+        }
+        self._write_atomically(
+            os.path.join(self._extracted_dir, f"{requested_arxiv_id}.json.gz"),
+            gzip.compress(json.dumps(content).encode("utf-8")),
+        )
+        self.mark("extracted", [requested_arxiv_id])
+        # The PDF is not needed anymore once the text is durable.
+        fetched_path = os.path.join(self._fetched_dir, f"{requested_arxiv_id}.pkl")
+        if os.path.exists(fetched_path):
+            os.remove(fetched_path)
+
+    def load_extracted(self, arxiv_id: str) -> Optional[IngestablePaper]:
+        path = os.path.join(self._extracted_dir, f"{arxiv_id}.json.gz")
+        if not self.is_done("extracted", arxiv_id) or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            content = json.loads(gzip.decompress(f.read()).decode("utf-8"))
+        content["published_date"] = date.fromisoformat(content["published_date"])
+        return IngestablePaper(**content)
+
+    def summary(self) -> str:
+        return ", ".join(f"{s}: {len(self._stages[s])}" for s in BUILD_STAGES)
@@ -0,0 +1,127 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+COMPRESSION_METHODS = ["pca", "truncate"]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingCompressor:
+    """
+    Shrinks embeddings before they are stored in the vector index: PCA
+    projection or Matryoshka style truncation to fewer dimensions, optionally
+    followed by symmetric per-dimension int8 scalar quantization. The fitted
+    parameters are saved next to the embedding model so that query embeddings
+    go through exactly the same transform at search time.
+    """
+
+    def __init__(
+        self, method: str = "pca", dimensions: int = 256, quantize_int8: bool = False
+    ):
+        if method not in COMPRESSION_METHODS:
+            raise ValueError(
+                f"Unknown compression method {method}, expected one of {COMPRESSION_METHODS}"
+            )
+        self.method = method
+        self.dimensions = dimensions
+        self.quantize_int8 = quantize_int8
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scale is not None
+
+    def fit(self, vectors: np.ndarray) -> "EmbeddingCompressor":
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if self.dimensions > vectors.shape[1]:
+            raise ValueError(
+                f"Cannot reduce {vectors.shape[1]} dimensional embeddings to {self.dimensions}."
+            )
+        if self.method == "pca":
+            if len(vectors) < self.dimensions:
+                raise ValueError(
+                    f"PCA to {self.dimensions} dimensions needs at least as many samples, got {len(vectors)}."
+                )
+            self.mean = vectors.mean(axis=0)
+            _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+            self.components = vt[: self.dimensions].T.astype(np.float32)
+        reduced = self.reduce(vectors)
+        # Calibrate int8 scales on the observed range of every dimension.
+        self.scale = np.maximum(np.abs(reduced).max(axis=0), 1e-12) / 127.0
+        return self
+
+    def reduce(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if self.method == "pca":
+            reduced = (vectors - self.mean) @ self.components
+        else:
+            reduced = vectors[..., : self.dimensions]
+        return _normalize(reduced).astype(np.float32)
+
+    def quantize(self, reduced: np.ndarray) -> np.ndarray:
+        return np.clip(np.round(reduced / self.scale), -127, 127).astype(np.int8)
+
+    def dequantize(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        reduced = self.reduce(vectors)
+        if self.quantize_int8:
+            return self.dequantize(self.quantize(reduced))
+        return reduced
+
+    def bytes_per_vector(self) -> int:
+        # Neo4j stores the dequantized vectors as float32.
+        return self.dimensions * 4
+
+    def code_bytes_per_vector(self) -> int:
+        # Size of the int8 codes, only relevant to a store that keeps them.
+        return self.dimensions * (1 if self.quantize_int8 else 4)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(
+            path,
+            method=self.method,
+            dimensions=self.dimensions,
+            quantize_int8=self.quantize_int8,
+            mean=self.mean if self.mean is not None else np.zeros(0),
+            components=self.components if self.components is not None else np.zeros(0),
+            scale=self.scale,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingCompressor":
+        with np.load(path) as data:
+            compressor = cls(
+                method=str(data["method"]),
+                dimensions=int(data["dimensions"]),
+                quantize_int8=bool(data["quantize_int8"]),
+            )
+            if compressor.method == "pca":
+                compressor.mean = data["mean"]
+                compressor.components = data["components"]
+            compressor.scale = data["scale"]
+        return compressor
+
+
+class CompressedEmbeddings(Embeddings):
+    def __init__(self, base_embeddings: Embeddings, compressor: EmbeddingCompressor):
+        self.base_embeddings = base_embeddings
+        self.compressor = compressor
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.base_embeddings.embed_documents(texts)
+        return self.compressor.transform(np.array(vectors)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.base_embeddings.embed_query(text)
+        return self.compressor.transform(np.array(vector)).tolist()
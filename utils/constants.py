@@ -50,6 +50,14 @@ seed_arxiv_paper_ids = [
 EMBED_PATH = "./embed_models"
 MODELS_PATH = "./models"
 TEMP_VISUAL_GRAPH_PATH = "./temp-graph.html"
+BUILD_PROGRESS_PATH = "./build-progress"
+EMBEDDING_COMPRESSOR_PATH = "./embed_models/embedding_compressor.npz"
+GGUF_MODEL_PATH = "./models/gguf/Meta-Llama-3.1-8B-Instruct-Q4_K_M.gguf"
+CATEGORY_TAXONOMY_PATH = "./2_build-knowledge-graph/arxiv_category_taxonomy.json"
+# Regenerated by the build job when missing, one file per taxonomy version.
+CATEGORY_EMBEDDINGS_CACHE_PATH = (
+    "./2_build-knowledge-graph/arxiv_category_embeddings_v{version}.npz"
+)
 TEMP_VISUAL_1_2_GRAPH_PATH = "./temp-first-and-second-order-graph.html"
 
 huggingface_token = os.getenv("HF_TOKEN")
@@ -58,6 +66,88 @@ embed_model_name = "Alibaba-NLP/gte-large-en-v1.5"
 colbert_model = "colbert-ir/colbertv2.0"
 local_model_to_be_quantised = "NousResearch/Meta-Llama-3.1-8B-Instruct"
 llm_temperture = 0.01
+# Local LLM backend: auto uses transformers with a GPU and llamacpp without.
+local_llm_backend = "auto"  # auto, transformers or llamacpp
+gguf_model_repo = "bartowski/Meta-Llama-3.1-8B-Instruct-GGUF"
+llamacpp_threads = None  # None uses every CPU core
+llamacpp_context_length = 8192
+llamacpp_batch_size = 512
+# Prompts from all sessions are batched on the shared local LLM, an idle
+# scheduler waits up to llm_batch_wait_ms for a batch to fill.
+llm_max_batch_size = 8
+llm_batch_wait_ms = 20
+# Remote OpenAI compatible models, see utils/cai_model.py. Limits are per
+# endpoint and shared by every session.
+remote_llm_max_connections = 16
+remote_llm_max_concurrency = 8
+remote_llm_timeout_seconds = 120.0
+remote_llm_connect_timeout_seconds = 10.0
+remote_llm_max_retries = 3
+remote_llm_backoff_seconds = 0.5
+remote_llm_max_backoff_seconds = 8.0
+
+# Ingestion embedding settings, see utils/embedding_utils.py
+# Lower precisions embed the chunks with a different model than the fp32 query
+# embeddings, check their recall with benchmarks/embedding_throughput.py first.
+# auto picks fp16 on a GPU and int8 on CPU.
+embedding_precision = "fp32"  # fp32, fp16, bf16, int8 or auto
+embedding_batch_size = 128
+embedding_max_tokens_per_batch = 128 * 1024
+embedding_window_size = 1024
+chunk_rows_per_transaction = 500
+# Near duplicate chunk elimination, see utils/dedup_utils.py. Opt-in with a
+# threshold such as 0.9: the signatures are not part of the build manifest, so
+# a resumed build only compares against the chunks seen since it resumed.
+chunk_dedup_threshold = 0.0
+chunk_dedup_mode = "merge"  # drop or merge
+# Compact chunk embeddings, see utils/compression_utils.py
+embedding_compression = "none"  # none, pca or truncate
+embedding_compressed_dimensions = 256
+embedding_quantize_int8 = False
+embedding_compression_fit_samples = 4096
+# Citation crawler settings, see utils/crawler_utils.py
+crawler_workers = 4
+crawler_request_interval = 3.0  # seconds between arXiv requests, across workers
+# Query time chunk search, see utils/retriever_utils.py
+chunk_search_mode = "global"  # global, category or hierarchical
+category_routing_top_categories = 3
+category_routing_min_score = 0.8
+category_routing_max_candidates = 20000
+hierarchical_top_papers = 20
+# Confidence gated ColBERT reranking in the hybrid retriever. Margins are on
+# the normalized [0, 1] vector similarity between rank k and k + 1.
+adaptive_rerank = False
+rerank_skip_margin = 0.02
+rerank_skip_agreement = 1.0
+rerank_shrink_margin = 0.005
+# Score fusion in the hybrid retriever: "weighted_sum" of max normalized signals
+# or "rrf". Signals are relevance, citations, centrality and recency.
+hybrid_fusion_method = "weighted_sum"
+hybrid_fusion_weights = {
+    "relevance": 0.33,
+    "citations": 0.66,
+    "centrality": 0.0,
+    "recency": 0.0,
+}
+hybrid_rrf_k = 60
+recency_half_life_days = 365
+# The follow-up answer is rendered from the paper cards precomputed by
+# 2_build-knowledge-graph/build-paper-cards.py when every cited paper has one.
+use_paper_cards = True
+paper_card_top_n = 3
+paper_card_batch_size = 16
+# Token budget of the RAG answer prompts, the retrieved chunks are merged per
+# paper and the lowest ranked ones trimmed to fit, see utils/context_utils.py.
+# Fits top_k 7 chunks of 1000 tokens and the prompt template, for local models
+# it is capped at their context length minus answer_max_new_tokens.
+prompt_max_tokens = 8192
+# Tokens generated at most for the RAG answer and for the follow-up summary of
+# the cited papers, see utils/generation_utils.py.
+answer_max_new_tokens = 1024
+followup_max_new_tokens = 512
+# Resources the app loads in background threads, see streamlit_pages/commons.py.
+# local_llm is only loaded once a session uses it, colbert not with adaptive_rerank.
+warmup_components = ["neo4j", "embedding", "local_llm", "colbert"]
 
 llama3_stop_token = "<|eot_id|>"
 llama3_bos_token = "<|begin_of_text|>"  # Beggining of sequence token
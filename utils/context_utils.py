@@ -0,0 +1,147 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.llms import BaseLLM
+
+import utils.constants as const
+from utils.arxiv_utils import PaperChunk
+from utils.huggingface_utils import context_length, count_tokens
+
+# Adjacent chunks of a paper overlap by up to chunk_overlap tokens of the
+# ingestion splitter, shorter matches are treated as coincidences.
+_min_overlap_chars = 20
+_max_overlap_chars = 2000
+
+
+def overlap_length(left: str, right: str) -> int:
+    # Length of the longest suffix of left that is also a prefix of right.
+    longest = min(len(left), len(right), _max_overlap_chars)
+    for n in range(longest, _min_overlap_chars - 1, -1):
+        if left.endswith(right[:n]):
+            return n
+    return 0
+
+
+def merge_into_segments(segments: List[str], text: str) -> bool:
+    # Adds text to the segments of a paper, joining it with a segment it
+    # overlaps. Returns whether it was merged rather than appended.
+    for i, segment in enumerate(segments):
+        if text in segment:
+            return True
+        if segment in text:
+            segments[i] = text
+            return True
+        n = overlap_length(segment, text)
+        if n:
+            segments[i] = segment + text[n:]
+            return True
+        n = overlap_length(text, segment)
+        if n:
+            segments[i] = text + segment[n:]
+            return True
+    segments.append(text)
+    return False
+
+
+def render_paper_block(arxiv_id: str, segments: List[str]) -> str:
+    text = "\n...\n".join(segments)
+    return f"Document:{text}\nDocument arXiv ID: {arxiv_id}\n\n\n"
+
+
+class ContextPacker:
+    """
+    Packs ranked chunks into a context of at most max_tokens tokens of the
+    LLM. Chunks of the same paper share one document block with overlapping
+    text kept once, the lowest ranked chunks are truncated or dropped to fit.
+    """
+
+    def __init__(self, llm: BaseLLM, max_tokens: int):
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.stats: Dict[str, Any] = dict()
+
+    def _truncate(
+        self, arxiv_id: str, segments: List[str], text: str, budget: int
+    ) -> Optional[List[str]]:
+        # Segments with the longest word prefix of text whose block still fits
+        # in budget tokens, None if no word fits.
+        words = text.split(" ")
+        low, high, fitting = 0, len(words), None
+        while low < high:
+            mid = (low + high + 1) // 2
+            candidate = list(segments)
+            merge_into_segments(candidate, " ".join(words[:mid]))
+            if (
+                count_tokens(self.llm, render_paper_block(arxiv_id, candidate))
+                <= budget
+            ):
+                low, fitting = mid, candidate
+            else:
+                high = mid - 1
+        return fitting
+
+    def pack(self, chunks: List[PaperChunk]) -> str:
+        segments: Dict[str, List[str]] = dict()
+        block_tokens: Dict[str, int] = dict()
+        used, packed, merged, truncated = 0, 0, 0, 0
+        for chunk in chunks:
+            arxiv_id = chunk.paper.arxiv_id
+            paper_segments = list(segments.get(arxiv_id, list()))
+            is_merged = merge_into_segments(paper_segments, chunk.text)
+            tokens = count_tokens(
+                self.llm, render_paper_block(arxiv_id, paper_segments)
+            )
+            previous = block_tokens.get(arxiv_id, 0)
+            if used - previous + tokens > self.max_tokens:
+                # The chunks are ranked, everything from here on is dropped
+                # apart from the part of this chunk that still fits.
+                paper_segments = self._truncate(
+                    arxiv_id,
+                    segments.get(arxiv_id, list()),
+                    chunk.text,
+                    self.max_tokens - used + previous,
+                )
+                if paper_segments:
+                    segments[arxiv_id] = paper_segments
+                    block_tokens[arxiv_id] = count_tokens(
+                        self.llm, render_paper_block(arxiv_id, paper_segments)
+                    )
+                    packed += 1
+                    truncated += 1
+                break
+            segments[arxiv_id] = paper_segments
+            block_tokens[arxiv_id] = tokens
+            used += tokens - previous
+            packed += 1
+            merged += int(is_merged)
+        context = "".join(
+            render_paper_block(arxiv_id, s) for arxiv_id, s in segments.items()
+        )
+        self.stats = {
+            "retrieved_chunks": len(chunks),
+            "packed_chunks": packed,
+            "merged_chunks": merged,
+            "truncated_chunks": truncated,
+            "dropped_chunks": len(chunks) - packed,
+            "papers": len(segments),
+            "context_tokens": sum(block_tokens.values()),
+            "max_context_tokens": self.max_tokens,
+        }
+        return context
+
+
+def context_token_budget(
+    llm: BaseLLM, empty_prompt: str, max_prompt_tokens: int
+) -> int:
+    # Tokens left for the context in a prompt rendered without it.
+    return max(max_prompt_tokens - count_tokens(llm, empty_prompt), 0)
+
+
+def prompt_token_budget(
+    llm: BaseLLM, max_prompt_tokens: int = const.prompt_max_tokens
+) -> int:
+    # Capped so that the prompt and the answer fit in the context window of a
+    # local model.
+    window = context_length(llm)
+    if window is None:
+        return max_prompt_tokens
+    return min(max_prompt_tokens, window - const.answer_max_new_tokens)
@@ -0,0 +1,156 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from utils.arxiv_utils import IngestablePaper
+
+
+class CitationCrawler:
+    """
+    Grows the corpus from the seed papers by following arXiv citations up to
+    `max_depth` hops. Candidates wait in a priority frontier ranked by how many
+    already crawled papers cite them, so the most cited papers are fetched
+    first when a budget cuts the crawl short. The crawl stops scheduling new
+    papers once the paper, byte or wall time budget is exhausted.
+
+    `fetch_fn` returns the extracted paper and the number of bytes downloaded
+    for it, it is called from `workers` threads, at most once every
+    `request_interval` seconds to stay within arXiv's rate limits, unless
+    `is_cached` reports the paper is available locally.
+    """
+
+    def __init__(
+        self,
+        seed_ids: List[str],
+        fetch_fn: Callable[[str], Tuple[IngestablePaper, int]],
+        max_depth: int = 1,
+        max_papers: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        workers: int = 4,
+        request_interval: float = 3.0,
+        is_cached: Optional[Callable[[str], bool]] = None,
+    ):
+        self.fetch_fn = fetch_fn
+        self.max_depth = max_depth
+        self.max_papers = max_papers
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.workers = workers
+        self.request_interval = request_interval
+        self.is_cached = is_cached
+        self._frontier: List[Tuple[float, int, int, str]] = list()
+        self._depths: Dict[str, int] = dict()
+        self._citation_counts: Counter = Counter()
+        self._scheduled: Set[str] = set()
+        self._order = 0
+        self._rate_lock = threading.Lock()
+        self._last_request_at = 0.0
+        self.fetched_count = 0
+        self.failed_count = 0
+        self.fetched_bytes = 0
+        self.started_at: Optional[float] = None
+        for seed_id in dict.fromkeys(seed_ids):
+            self._push(seed_id, depth=0, priority=float("inf"))
+
+    def _push(self, arxiv_id: str, depth: int, priority: float):
+        self._depths[arxiv_id] = min(depth, self._depths.get(arxiv_id, depth))
+        self._order += 1
+        heapq.heappush(
+            self._frontier, (-priority, self._depths[arxiv_id], self._order, arxiv_id)
+        )
+
+    def _pop(self) -> Optional[str]:
+        while self._frontier:
+            negative_priority, _, _, arxiv_id = heapq.heappop(self._frontier)
+            if arxiv_id in self._scheduled:
+                continue
+            # Entries are pushed again whenever their priority rises, skip the
+            # outdated ones.
+            if (
+                negative_priority != float("-inf")
+                and -negative_priority != self._citation_counts[arxiv_id]
+            ):
+                continue
+            return arxiv_id
+        return None
+
+    def _budget_exhausted(self, in_flight_count: int) -> bool:
+        # Papers still being fetched count against the budget, the byte budget
+        # can only be checked once their PDFs are downloaded.
+        if (
+            self.max_papers is not None
+            and self.fetched_count + in_flight_count >= self.max_papers
+        ):
+            return True
+        if self.max_bytes is not None and self.fetched_bytes >= self.max_bytes:
+            return True
+        if (
+            self.max_seconds is not None
+            and time.perf_counter() - self.started_at >= self.max_seconds
+        ):
+            return True
+        return False
+
+    def _throttled_fetch(self, arxiv_id: str) -> Tuple[IngestablePaper, int]:
+        if self.is_cached and self.is_cached(arxiv_id):
+            return self.fetch_fn(arxiv_id)
+        with self._rate_lock:
+            wait_for = self._last_request_at + self.request_interval - time.time()
+            if wait_for > 0:
+                time.sleep(wait_for)
+            self._last_request_at = time.time()
+        return self.fetch_fn(arxiv_id)
+
+    def _expand(self, paper: IngestablePaper, depth: int):
+        if depth >= self.max_depth:
+            return
+        for cited in set(paper.cited_arxiv_papers):
+            if cited in self._scheduled:
+                continue
+            self._citation_counts[cited] += 1
+            self._push(cited, depth + 1, self._citation_counts[cited])
+
+    def crawl(self) -> Iterator[IngestablePaper]:
+        self.started_at = time.perf_counter()
+        in_flight: Dict[Future, str] = dict()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="crawler"
+        ) as executor:
+            while True:
+                while len(in_flight) < self.workers and not self._budget_exhausted(
+                    len(in_flight)
+                ):
+                    arxiv_id = self._pop()
+                    if arxiv_id is None:
+                        break
+                    self._scheduled.add(arxiv_id)
+                    in_flight[executor.submit(self._throttled_fetch, arxiv_id)] = (
+                        arxiv_id
+                    )
+                if not in_flight:
+                    return
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    arxiv_id = in_flight.pop(future)
+                    try:
+                        paper, fetched_bytes = future.result()
+                    except Exception as e:
+                        self.failed_count += 1
+                        print(f"Error in crawling arxiv paper {arxiv_id}: {e}")
+                        continue
+                    self.fetched_count += 1
+                    self.fetched_bytes += fetched_bytes
+                    self._expand(paper, self._depths[arxiv_id])
+                    yield paper
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return (
+            f"Crawled {self.fetched_count} papers ({self.failed_count} failed), "
+            f"{self.fetched_bytes / 2**20:.1f} MiB in {elapsed:.1f}s, "
+            f"{len(set(a for *_, a in self._frontier) - self._scheduled)} papers left in the frontier"
+        )
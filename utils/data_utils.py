@@ -1,32 +1,126 @@
-from typing import List
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import requests
 from bs4 import BeautifulSoup
+from langchain.docstore.document import Document
+from langchain.graphs import Neo4jGraph
+from neo4j import GraphDatabase
 
 from utils.arxiv_utils import IngestablePaper
 
 
-def create_query_for_category_insertion() -> str:
+def fetch_arxiv_category_taxonomy() -> List[Dict[str, str]]:
     URL = "https://arxiv.org/category_taxonomy"
     page = requests.get(URL)
     soup = BeautifulSoup(page.content, "html.parser")
     results = soup.find(id="category_taxonomy_list")
     elements = results.find_all("div", class_="columns divided")
-    query = ""
-    for i, e in enumerate(elements):
+    categories = list()
+    for e in elements:
         code = e.find("h4").text
         title = e.find("span").text.strip()
         code = code.replace(title, "").strip()
         title = title.replace("(", "").replace(")", "")
         desc = sanitize(e.find("p").text).strip()
-        query += f"""
-            CREATE (category_{i}:Category {{code: "{code}", title: "{title}", description: "{desc}"}})
-        """
+        categories.append({"code": code, "title": title, "description": desc})
+    categories.append(
+        {
+            "code": "astro-ph",
+            "title": "General Astrophysics",
+            "description": "General Astrophysics",
+        }
+    )
+    return categories
+
+
+def load_category_taxonomy(path: str) -> Tuple[int, List[Dict[str, str]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        taxonomy = json.load(f)
+    return taxonomy["version"], taxonomy["categories"]
+
+
+def save_category_taxonomy(path: str, categories: List[Dict[str, str]], version: int):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": version,
+                "source": "https://arxiv.org/category_taxonomy",
+                "categories": categories,
+            },
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+        f.write("\n")
+
+
+def create_category_embedding_text(category: Dict[str, str]) -> str:
+    # The text Neo4jVector.from_existing_graph embeds for the "title" and
+    # "description" properties.
+    return f"\ntitle:{category['title']}\ndescription:{category['description']}"
 
-    query += f"""
-        CREATE (category_astro_ph:Category {{code: "astro-ph", title: "General Astrophysics", description: "General Astrophysics"}})
+
+def load_category_embeddings(
+    categories: List[Dict[str, str]],
+    embedding_model: str,
+    cache_path: str,
+    embed_documents: Callable[[List[str]], List[List[float]]],
+) -> List[List[float]]:
+    # Cached embeddings are keyed on the model and the embedded text, so only
+    # new or edited categories are embedded after a taxonomy update.
+    keys = [
+        hashlib.sha256(
+            f"{embedding_model}:{create_category_embedding_text(c)}".encode("utf-8")
+        ).hexdigest()
+        for c in categories
+    ]
+    cache = dict()
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            cache = dict(zip(data["keys"].tolist(), data["embeddings"]))
+    missing = [i for i, k in enumerate(keys) if k not in cache]
+    if missing:
+        print(f"Embedding {len(missing)} categories missing from the cache")
+        vectors = embed_documents(
+            [create_category_embedding_text(categories[i]) for i in missing]
+        )
+        for i, v in zip(missing, vectors):
+            cache[keys[i]] = np.asarray(v, dtype=np.float32)
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        np.savez(
+            cache_path,
+            keys=np.array(list(cache.keys())),
+            embeddings=np.stack(list(cache.values())),
+        )
+    return [cache[k].tolist() for k in keys]
+
+
+def insert_categories(
+    graph: Neo4jGraph,
+    categories: List[Dict[str, str]],
+    embeddings: Optional[List[List[float]]] = None,
+) -> int:
+    query = r"""
+    UNWIND $categories AS category
+    MERGE (c:Category {code: category.code})
+    SET c.title = category.title, c.description = category.description
+    WITH c, category WHERE category.embedding IS NOT NULL
+    CALL db.create.setNodeVectorProperty(c, 'embedding', category.embedding)
+    RETURN COUNT(*) AS embedded
     """
-    return query
+    rows = [
+        {**c, "embedding": embeddings[i] if embeddings else None}
+        for i, c in enumerate(categories)
+    ]
+    return graph.query(query, params={"categories": rows})[0]["embedded"]
 
 
 def sanitize(text):
@@ -47,6 +141,11 @@ def create_indices_queries() -> List[str]:
         "CREATE TEXT INDEX category_code IF NOT EXISTS FOR (c:Category) ON (c.code)",
         "CREATE TEXT INDEX author_name IF NOT EXISTS FOR (a:Author) ON (a.name)",
         "CREATE TEXT INDEX paper_id IF NOT EXISTS FOR (p:Paper) ON (p.id)",
+        # Backs the MERGE/MATCH on Paper.id used while inserting papers and chunks.
+        "CREATE CONSTRAINT paper_id_unique IF NOT EXISTS FOR (p:Paper) REQUIRE p.id IS UNIQUE",
+        "CREATE RANGE INDEX chunk_arxiv_id IF NOT EXISTS FOR (c:Chunk) ON (c.arxiv_id)",
+        # Lets resumed builds MERGE chunks instead of duplicating them.
+        "CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE",
     ]
 
 
@@ -78,12 +177,277 @@ def create_cypher_batch_query_to_insert_arxiv_papers(objs: List[IngestablePaper]
     return query
 
 
-def create_cypher_batch_query_to_create_citation_relationship(arxiv_paper_id: str):
+def create_citation_pairs(
+    citations: Dict[str, List[str]], known_paper_ids: Iterable[str]
+) -> List[Tuple[str, str]]:
+    known_paper_ids = set(known_paper_ids)
+    return [
+        (citing, cited)
+        for citing, cited_papers in citations.items()
+        for cited in set(cited_papers)
+        if cited in known_paper_ids and cited != citing
+    ]
+
+
+def create_citation_relationships(
+    graph: Neo4jGraph, pairs: List[Tuple[str, str]], batch_size: int = 10000
+) -> int:
     query = r"""
-    MATCH (p:Paper {id: "$arxiv_paper_id"})
-    MATCH (cited_papers:Paper) WHERE cited_papers.id IN p.cited_arxiv_papers
-    MERGE (p)-[:CITES]->(cited_papers)
-    """.replace(
-        "$arxiv_paper_id", arxiv_paper_id
+    UNWIND $pairs AS pair
+    MATCH (p:Paper {id: pair[0]})
+    MATCH (cited_paper:Paper {id: pair[1]})
+    MERGE (p)-[:CITES]->(cited_paper)
+    RETURN COUNT(*) AS edges
+    """
+    start = time.perf_counter()
+    edges, batches = 0, 0
+    for i in range(0, len(pairs), batch_size):
+        batch = [list(pair) for pair in pairs[i : i + batch_size]]
+        edges += graph.query(query, params={"pairs": batch})[0]["edges"]
+        batches += 1
+    print(
+        f"Created {edges} citation relationships from {len(pairs)} pairs in {batches} batches, {time.perf_counter() - start:.2f}s"
     )
-    return query
+    return edges
+
+
+def get_citation_pairs_for_new_papers(
+    graph: Neo4jGraph, new_citations: Dict[str, List[str]]
+) -> List[Tuple[str, str]]:
+    new_paper_ids = list(new_citations.keys())
+    cited_ids = list({c for cited in new_citations.values() for c in cited})
+    existing_cited_ids = [
+        r["id"]
+        for r in graph.query(
+            "MATCH (p:Paper) WHERE p.id IN $ids RETURN p.id AS id",
+            params={"ids": cited_ids},
+        )
+    ]
+    # Papers already in the graph may cite the new ones as well.
+    existing_citations = {
+        r["id"]: r["cited"]
+        for r in graph.query(
+            r"""
+            MATCH (p:Paper)
+            WHERE NOT p.id IN $new_ids
+              AND any(cited IN p.cited_arxiv_papers WHERE cited IN $new_ids)
+            RETURN p.id AS id, [cited IN p.cited_arxiv_papers WHERE cited IN $new_ids] AS cited
+            """,
+            params={"new_ids": new_paper_ids},
+        )
+    }
+    return create_citation_pairs(
+        new_citations, set(existing_cited_ids) | set(new_paper_ids)
+    ) + create_citation_pairs(existing_citations, new_paper_ids)
+
+
+def link_papers_to_chunks(
+    graph: Neo4jGraph, links: List[Tuple[str, str]], batch_size: int = 10000
+) -> int:
+    query = r"""
+    UNWIND $links AS link
+    MATCH (p:Paper {id: link[0]})
+    MATCH (c:Chunk {id: link[1]})
+    MERGE (p)-[:CONTAINS_TEXT]->(c)
+    RETURN COUNT(*) AS links
+    """
+    created = 0
+    for i in range(0, len(links), batch_size):
+        batch = [list(link) for link in links[i : i + batch_size]]
+        created += graph.query(query, params={"links": batch})[0]["links"]
+    return created
+
+
+def create_vector_index_query(
+    index_name: str,
+    node_label: str,
+    dimension: int,
+    property_name: str = "embedding",
+    similarity_function: str = "cosine",
+) -> str:
+    return f"""
+    CREATE VECTOR INDEX {index_name} IF NOT EXISTS
+    FOR (n:{node_label}) ON n.{property_name}
+    OPTIONS {{indexConfig: {{
+        `vector.dimensions`: {dimension},
+        `vector.similarity_function`: '{similarity_function}'
+    }}}}
+    """
+
+
+def create_chunk_vector_index_query(
+    dimension: int, index_name: str = "vector", similarity_function: str = "cosine"
+) -> str:
+    # Same index Neo4jVector creates for the default "Chunk" node label.
+    return create_vector_index_query(
+        index_name, "Chunk", dimension, similarity_function=similarity_function
+    )
+
+
+def create_paper_embedding_text(title: str, summary: str) -> str:
+    return f"{title}\n{summary}"
+
+
+def embed_papers(
+    graph: Neo4jGraph,
+    embed_texts: Callable[[List[str]], List[List[float]]],
+    batch_size: int = 256,
+) -> int:
+    # Papers are embedded from their title and summary, for the first stage of
+    # the hierarchical paper-then-chunk search. Only papers without an
+    # embedding are picked up, so resumed builds continue where they stopped.
+    write_query = r"""
+    UNWIND $rows AS row
+    MATCH (p:Paper {id: row.id})
+    CALL db.create.setNodeVectorProperty(p, 'embedding', row.embedding)
+    RETURN COUNT(p) AS embedded
+    """
+    embedded = 0
+    while True:
+        papers = graph.query(
+            """
+            MATCH (p:Paper) WHERE p.embedding IS NULL AND p.title IS NOT NULL
+            RETURN p.id AS id, p.title AS title, coalesce(p.summary, "") AS summary
+            LIMIT $limit
+            """,
+            params={"limit": batch_size},
+        )
+        if not papers:
+            return embedded
+        vectors = embed_texts(
+            [create_paper_embedding_text(p["title"], p["summary"]) for p in papers]
+        )
+        rows = [{"id": p["id"], "embedding": v} for p, v in zip(papers, vectors)]
+        embedded += graph.query(write_query, params={"rows": rows})[0]["embedded"]
+
+
+def create_graph_version() -> str:
+    return f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def stamp_graph_version(
+    graph: Neo4jGraph, embedding_model: str, version: Optional[str] = None
+) -> str:
+    # Anything cached from the graph's content can be keyed on this version, it
+    # changes whenever the graph is rebuilt or restored from another snapshot.
+    version = version or create_graph_version()
+    graph.query(
+        """
+        MERGE (m:GraphMetadata {id: "graph"})
+        SET m.version = $version, m.embedding_model = $embedding_model, m.updated = datetime()
+        """,
+        params={"version": version, "embedding_model": embedding_model},
+    )
+    return version
+
+
+def get_graph_version(graph: Neo4jGraph) -> Optional[str]:
+    result = graph.query(
+        'MATCH (m:GraphMetadata {id: "graph"}) RETURN m.version AS version'
+    )
+    return result[0]["version"] if result else None
+
+
+def create_chunk_id(arxiv_id: str, text: str) -> str:
+    return hashlib.md5(f"{arxiv_id}:{text}".encode("utf-8")).hexdigest()
+
+
+class ChunkBulkWriter:
+    _write_query = r"""
+    UNWIND $rows AS row
+    MATCH (p:Paper {id: row.arxiv_id})
+    MERGE (c:Chunk {id: row.id})
+    ON CREATE
+      SET
+        c.text = row.text,
+        c.arxiv_id = row.arxiv_id
+    MERGE (p)-[:CONTAINS_TEXT]->(c)
+    WITH c, row
+    CALL db.create.setNodeVectorProperty(c, 'embedding', row.embedding)
+    RETURN collect(c.id) AS written_ids
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        username: str,
+        password: str,
+        database: str = "neo4j",
+        rows_per_transaction: int = 500,
+    ):
+        self.rows_per_transaction = rows_per_transaction
+        self._driver = GraphDatabase.driver(uri, auth=(username, password))
+        self._session = self._driver.session(database=database)
+        self._rows: List[Dict] = list()
+        self.written_count = 0
+        self.written_per_paper: Counter = Counter()
+        self.failed_count = 0
+        self.unmatched_count = 0
+        self.transaction_count = 0
+        self.write_seconds = 0.0
+
+    def __enter__(self) -> "ChunkBulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _run_write(tx, rows: List[Dict]) -> List[str]:
+        return tx.run(ChunkBulkWriter._write_query, rows=rows).single()["written_ids"]
+
+    def _write_rows(self, rows: List[Dict]) -> List[Dict]:
+        try:
+            self.transaction_count += 1
+            written_ids = set(self._session.execute_write(self._run_write, rows))
+        except Exception as e:
+            if len(rows) == 1:
+                print(f"Error in inserting chunk {rows[0]['id']}: {e}")
+                self.failed_count += 1
+                return list()
+            # Bisect so that a single bad row only costs log(n) extra round trips.
+            mid = len(rows) // 2
+            return self._write_rows(rows[:mid]) + self._write_rows(rows[mid:])
+        # Rows whose paper is not in the graph match nothing and are not written.
+        unmatched = [r for r in rows if r["id"] not in written_ids]
+        if unmatched:
+            print(
+                f"{len(unmatched)} chunks not written, their papers are missing: "
+                f"{sorted({r['arxiv_id'] for r in unmatched})}"
+            )
+            self.unmatched_count += len(unmatched)
+        return [r for r in rows if r["id"] in written_ids]
+
+    def flush(self) -> int:
+        if not self._rows:
+            return 0
+        rows, self._rows = self._rows, list()
+        start = time.perf_counter()
+        written_rows = self._write_rows(rows)
+        self.write_seconds += time.perf_counter() - start
+        self.written_count += len(written_rows)
+        self.written_per_paper.update(r["arxiv_id"] for r in written_rows)
+        return len(written_rows)
+
+    def write(self, embedded_chunks: List[Tuple[Document, List[float]]]) -> int:
+        written = 0
+        for doc, vector in embedded_chunks:
+            arxiv_id = doc.metadata["arxiv_id"]
+            self._rows.append(
+                {
+                    "id": create_chunk_id(arxiv_id, doc.page_content),
+                    "text": doc.page_content,
+                    "arxiv_id": arxiv_id,
+                    "embedding": vector,
+                }
+            )
+            if len(self._rows) >= self.rows_per_transaction:
+                written += self.flush()
+        return written
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._session.close()
+            self._driver.close()
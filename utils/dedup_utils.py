@@ -0,0 +1,112 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    # Pick the (bands, rows) split whose S-curve crosses 0.5 closest to the
+    # threshold, the curve's inflection point is roughly (1 / bands) ** (1 / rows).
+    best, best_error = (num_perm, 1), float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class MinHashDeduplicator:
+    """
+    Drops chunks that are near duplicates of a chunk seen earlier in the corpus,
+    e.g. repeated boilerplate, reference lists or overlapping arXiv versions.
+    Chunks are compared on word shingles with MinHash signatures, and LSH
+    banding keeps the lookup of candidate duplicates sub-linear.
+    """
+
+    def __init__(
+        self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _optimal_bands(threshold, num_perm)
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [
+            defaultdict(list) for _ in range(self.bands)
+        ]
+        self._signatures: List[np.ndarray] = list()
+        self._keys: List[str] = list()
+        self.seen_count = 0
+        self.dropped_count = 0
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = re.sub(r"\s+", " ", text.lower()).strip().split(" ")
+        n = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i : i + n]) for i in range(len(words) - n + 1)}
+        return np.array(
+            [zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self._shingles(text)
+        with np.errstate(over="ignore"):
+            permuted = (
+                (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+            ) & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[i * self.rows : (i + 1) * self.rows].tobytes()
+            for i in range(self.bands)
+        ]
+
+    def find_duplicate(self, signature: np.ndarray) -> Optional[str]:
+        candidates = set()
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(band.get(key, ()))
+        for c in candidates:
+            if np.mean(self._signatures[c] == signature) >= self.threshold:
+                return self._keys[c]
+        return None
+
+    def add(self, key: str, signature: np.ndarray):
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        self._keys.append(key)
+        for band, band_key in zip(self._buckets, self._band_keys(signature)):
+            band[band_key].append(index)
+
+    def deduplicate(
+        self, documents: List[Document], key_fn
+    ) -> Tuple[List[Document], List[Tuple[Document, str]]]:
+        kept, duplicates = list(), list()
+        for d in documents:
+            self.seen_count += 1
+            if not d.page_content.strip():
+                kept.append(d)
+                continue
+            signature = self.signature(d.page_content)
+            duplicate_of = self.find_duplicate(signature)
+            if duplicate_of is None:
+                self.add(key_fn(d), signature)
+                kept.append(d)
+            else:
+                self.dropped_count += 1
+                duplicates.append((d, duplicate_of))
+        return kept, duplicates
+
+    @property
+    def dropped_ratio(self) -> float:
+        return self.dropped_count / self.seen_count if self.seen_count else 0.0
@@ -0,0 +1,157 @@
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import torch
+from langchain.docstore.document import Document
+from sentence_transformers import SentenceTransformer
+
+import utils.constants as const
+
+EMBEDDING_PRECISIONS = ["auto", "fp32", "fp16", "bf16", "int8"]
+
+
+def _resolve_precision(precision: str, device: str) -> str:
+    # Opt-in: queries are embedded in fp32, lower precisions change the stored
+    # vectors, see benchmarks/embedding_throughput.py for their recall.
+    if precision != "auto":
+        return precision
+    return "fp16" if device == "cuda" else "int8"
+
+
+def load_sentence_transformer(
+    precision: str = "fp32", device: Optional[str] = None
+) -> Tuple[SentenceTransformer, str]:
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    precision = _resolve_precision(precision, device)
+    if precision not in EMBEDDING_PRECISIONS:
+        raise ValueError(
+            f"Unknown embedding precision {precision}, expected one of {EMBEDDING_PRECISIONS}"
+        )
+    if precision in ("fp16", "bf16") and device != "cuda":
+        raise ValueError(f"{precision} embeddings need a CUDA device.")
+    if precision == "int8" and device != "cpu":
+        raise ValueError("int8 embeddings are only supported on CPU.")
+
+    model = SentenceTransformer(
+        const.embed_model_name,
+        cache_folder=const.EMBED_PATH,
+        trust_remote_code=True,
+        device=device,
+    )
+    model.eval()
+    if precision == "fp16":
+        model = model.half()
+    elif precision == "bf16":
+        model = model.to(torch.bfloat16)
+    elif precision == "int8":
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model, precision
+
+
+class BatchedEmbeddingEngine:
+    """
+    Embeds chunks outside of the vector store. Chunks are buffered into a
+    window, sorted by token length and cut into buckets bounded both by number
+    of sequences and by padded tokens, so short chunks are embedded in large
+    batches and long chunks do not blow up the padding.
+    """
+
+    def __init__(
+        self,
+        precision: str = "fp32",
+        batch_size: int = const.embedding_batch_size,
+        max_tokens_per_batch: int = const.embedding_max_tokens_per_batch,
+        window_size: int = const.embedding_window_size,
+        device: Optional[str] = None,
+    ):
+        self.model, self.precision = load_sentence_transformer(precision, device)
+        self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.window_size = window_size
+        # Chunk embeddings only, paper embeddings are counted separately.
+        self.embedded_count = 0
+        self.embedding_seconds = 0.0
+        self.paper_count = 0
+        self.paper_seconds = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        if self.embedding_seconds == 0:
+            return 0.0
+        return self.embedded_count / self.embedding_seconds
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        max_length = self.model.get_max_seq_length()
+        encoded = self.model.tokenizer(
+            texts, add_special_tokens=True, truncation=True, max_length=max_length
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def make_buckets(self, texts: List[str]) -> List[List[int]]:
+        lengths = self.token_lengths(texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+        buckets, bucket = list(), list()
+        for i in order:
+            # Sorted ascending, so the current text sets the padded length.
+            padded_tokens = (len(bucket) + 1) * lengths[i]
+            if bucket and (
+                len(bucket) >= self.batch_size
+                or padded_tokens > self.max_tokens_per_batch
+            ):
+                buckets.append(bucket)
+                bucket = list()
+            bucket.append(i)
+        if bucket:
+            buckets.append(bucket)
+        return buckets
+
+    def _encode(self, texts: List[str], papers: bool = False) -> List[List[float]]:
+        start = time.perf_counter()
+        with torch.inference_mode():
+            vectors = self.model.encode(
+                texts,
+                batch_size=len(texts),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        if papers:
+            self.paper_seconds += time.perf_counter() - start
+            self.paper_count += len(texts)
+        else:
+            self.embedding_seconds += time.perf_counter() - start
+            self.embedded_count += len(texts)
+        return vectors.astype("float32").tolist()
+
+    def embed_texts(self, texts: List[str], papers: bool = False) -> List[List[float]]:
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for bucket in self.make_buckets(texts):
+            for i, v in zip(
+                bucket, self._encode([texts[i] for i in bucket], papers=papers)
+            ):
+                vectors[i] = v
+        return vectors
+
+    def embed_paper_texts(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_texts(texts, papers=True)
+
+    def _embed_window(
+        self, window: List[Document]
+    ) -> Iterator[List[Tuple[Document, List[float]]]]:
+        texts = [d.page_content for d in window]
+        for bucket in self.make_buckets(texts):
+            vectors = self._encode([texts[i] for i in bucket])
+            yield [(window[i], v) for i, v in zip(bucket, vectors)]
+
+    def embed_documents(
+        self, documents: Iterable[Document]
+    ) -> Iterator[List[Tuple[Document, List[float]]]]:
+        window = list()
+        for d in documents:
+            window.append(d)
+            if len(window) >= self.window_size:
+                yield from self._embed_window(window)
+                window = list()
+        if window:
+            yield from self._embed_window(window)
@@ -0,0 +1,99 @@
+from datetime import date
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+FUSION_METHODS = ["weighted_sum", "rrf"]
+
+
+def max_normalize(scores: np.ndarray) -> np.ndarray:
+    scores = np.asarray(scores, dtype=np.float64)
+    return scores / np.maximum(np.abs(scores).max(axis=-1, keepdims=True), 1e-12)
+
+
+def ranks(scores: np.ndarray) -> np.ndarray:
+    # 1 based rank of every candidate along the last axis, highest score first.
+    order = np.argsort(-np.asarray(scores), axis=-1, kind="stable")
+    result = np.empty_like(order)
+    np.put_along_axis(
+        result,
+        order,
+        np.broadcast_to(np.arange(1, order.shape[-1] + 1), order.shape),
+        axis=-1,
+    )
+    return result
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    # argpartition picks the top k in linear time, only those k are sorted.
+    scores = np.asarray(scores)
+    k = min(k, scores.shape[-1])
+    if k == 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(
+        -np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable"
+    )
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def recency_prior(
+    published: Sequence[date],
+    half_life_days: float = 365.0,
+    today: Optional[date] = None,
+) -> np.ndarray:
+    today = today or date.today()
+    age_days = np.array([(today - d).days for d in published], dtype=np.float64)
+    return np.power(0.5, np.maximum(age_days, 0) / half_life_days)
+
+
+def centrality_prior(citation_counts: np.ndarray) -> np.ndarray:
+    # Log scaled so that a handful of very highly cited papers do not flatten
+    # the prior of everything else.
+    return np.log1p(np.maximum(np.asarray(citation_counts, dtype=np.float64), 0))
+
+
+class ScoreFusion:
+    """
+    Combines per candidate signals (retriever scores and priors such as
+    citations or recency) into one score. Signals are arrays over the last
+    axis, so a batch of queries can be fused at once with 2D arrays.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        method: str = "weighted_sum",
+        rrf_k: int = 60,
+    ):
+        if method not in FUSION_METHODS:
+            raise ValueError(
+                f"Unknown fusion method {method}, expected one of {FUSION_METHODS}"
+            )
+        self.weights = weights
+        self.method = method
+        self.rrf_k = rrf_k
+
+    def fuse(self, signals: Dict[str, np.ndarray]) -> np.ndarray:
+        scores = None
+        for name, weight in self.weights.items():
+            if not weight:
+                continue
+            if self.method == "rrf":
+                contribution = weight / (self.rrf_k + ranks(signals[name]))
+            else:
+                contribution = weight * max_normalize(signals[name])
+            scores = contribution if scores is None else scores + contribution
+        if scores is None:
+            raise ValueError("At least one fusion weight must be non-zero")
+        return scores
+
+    def top_k(
+        self, ids: np.ndarray, signals: Dict[str, np.ndarray], k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.fuse(signals)
+        indices = top_k_indices(scores, k)
+        return (
+            np.take_along_axis(np.asarray(ids), indices, axis=-1),
+            np.take_along_axis(scores, indices, axis=-1),
+        )
@@ -0,0 +1,62 @@
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.llms import BaseLLM
+
+import utils.constants as const
+from utils.huggingface_utils import count_tokens, max_new_tokens_kwargs
+
+
+def truncate_at_stop(text: str, stop: List[str]) -> str:
+    # Backends that only stop on token ids may still emit a stop sequence.
+    for s in stop:
+        text = text.split(s)[0]
+    return text
+
+
+class GenerationController:
+    """
+    Runs the calls of one RAG pipeline on an LLM of any backend, stopping at
+    the Llama 3 end of turn token and within a token budget per call, and
+    records the prompt and generated tokens and the finish reason of each.
+    """
+
+    def __init__(self, llm: BaseLLM, stop: Optional[List[str]] = None):
+        self.llm = llm
+        self.stop = stop or [const.llama3_stop_token]
+        self.calls: List[Dict[str, Any]] = list()
+
+    def generate(self, name: str, prompt: str, max_new_tokens: int) -> str:
+        start = time.perf_counter()
+        result = self.llm.generate(
+            [prompt], stop=self.stop, **max_new_tokens_kwargs(self.llm, max_new_tokens)
+        )
+        seconds = time.perf_counter() - start
+        generation = result.generations[0][0]
+        text = truncate_at_stop(generation.text, self.stop)
+        # Remote endpoints report usage and finish reason, local backends
+        # are counted with their tokenizer.
+        usage = (result.llm_output or dict()).get("token_usage", dict())
+        generated_tokens = usage.get("completion_tokens") or count_tokens(
+            self.llm, text
+        )
+        finish_reason = (generation.generation_info or dict()).get("finish_reason")
+        if finish_reason is None:
+            finish_reason = "length" if generated_tokens >= max_new_tokens else "stop"
+        metrics = {
+            "name": name,
+            "prompt_tokens": usage.get("prompt_tokens")
+            or count_tokens(self.llm, prompt),
+            "generated_tokens": generated_tokens,
+            "max_new_tokens": max_new_tokens,
+            "finish_reason": finish_reason,
+            "seconds": seconds,
+        }
+        self.calls.append(metrics)
+        logging.info(f"Generation: {metrics}")
+        return text
+
+    @property
+    def last_call(self) -> Dict[str, Any]:
+        return self.calls[-1] if self.calls else dict()
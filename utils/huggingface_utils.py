@@ -1,48 +1,167 @@
-import torch
-import transformers
-from langchain.llms import HuggingFacePipeline
-from langchain_community.embeddings.sentence_transformer import (
-    SentenceTransformerEmbeddings,
-)
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+
 from langchain_core.embeddings import Embeddings
 from langchain_core.language_models.llms import BaseLLM
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
 
 import utils.constants as const
+from utils.compression_utils import CompressedEmbeddings, EmbeddingCompressor
+
+# torch, transformers and sentence-transformers take seconds to import, they are
+# only imported once a model is actually loaded.
+
+# transformers: 4-bit bitsandbytes checkpoint, needs CUDA. llamacpp: GGUF
+# checkpoint through llama-cpp-python, runs on CPU.
+LOCAL_LLM_BACKENDS = ["transformers", "llamacpp"]
+
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print("Device:", device)
-if device == "cuda":
-    print(torch.cuda.get_device_name(0))
+@lru_cache(maxsize=None)
+def get_device() -> str:
+    import torch
 
-bnb_config = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_use_double_quant=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.bfloat16,
-)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print("Device:", device)
+    if device == "cuda":
+        print(torch.cuda.get_device_name(0))
+    return device
+
+
+def get_bnb_config():
+    import torch
+    from transformers import BitsAndBytesConfig
+
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_use_double_quant=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=torch.bfloat16,
+    )
 
 
 def quantise_and_save_local_model():
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    get_device()
     model = AutoModelForCausalLM.from_pretrained(
         const.local_model_to_be_quantised,
         trust_remote_code=True,
-        quantization_config=bnb_config,
+        quantization_config=get_bnb_config(),
         device_map="auto",
     )
-    model.save_pretrained(save_directory=const.MODELS_PATH)
+    # The tokenizer and generation config are saved next to the weights, so
+    # that the app loads everything from MODELS_PATH without the network.
+    model.save_pretrained(save_directory=const.MODELS_PATH, safe_serialization=True)
+    model.generation_config.save_pretrained(const.MODELS_PATH)
+    AutoTokenizer.from_pretrained(const.local_model_to_be_quantised).save_pretrained(
+        const.MODELS_PATH
+    )
 
 
-def load_local_model() -> BaseLLM:
-    model = AutoModelForCausalLM.from_pretrained(
-        const.MODELS_PATH, trust_remote_code=True, device_map="auto"
+def resolve_local_llm_backend(backend: str = const.local_llm_backend) -> str:
+    if backend == "auto":
+        return "transformers" if get_device() == "cuda" else "llamacpp"
+    if backend not in LOCAL_LLM_BACKENDS:
+        raise ValueError(
+            f"Unknown local LLM backend {backend}, expected auto or one of {LOCAL_LLM_BACKENDS}"
+        )
+    return backend
+
+
+def download_gguf_model() -> str:
+    from huggingface_hub import hf_hub_download
+
+    return hf_hub_download(
+        repo_id=const.gguf_model_repo,
+        filename=os.path.basename(const.GGUF_MODEL_PATH),
+        local_dir=os.path.dirname(const.GGUF_MODEL_PATH),
+    )
+
+
+def load_local_tokenizer(model_path: str = const.MODELS_PATH):
+    from transformers import AutoTokenizer
+
+    if os.path.exists(os.path.join(model_path, "tokenizer_config.json")):
+        return AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+    # Models downloaded before the tokenizer was saved with them.
+    print(
+        f"No tokenizer in {model_path}, fetching it for {const.local_model_to_be_quantised}"
+    )
+    return AutoTokenizer.from_pretrained(const.local_model_to_be_quantised)
+
+
+def load_local_causal_lm(model_path: str = const.MODELS_PATH):
+    from transformers import AutoModelForCausalLM
+
+    get_device()
+    # Memory maps the safetensors checkpoint and loads it straight to the
+    # device, without materializing a randomly initialized copy first.
+    return AutoModelForCausalLM.from_pretrained(
+        model_path,
+        trust_remote_code=True,
+        device_map="auto",
+        local_files_only=True,
+        low_cpu_mem_usage=True,
+        use_safetensors=True,
     )
-    tokenizer = AutoTokenizer.from_pretrained(const.local_model_to_be_quantised)
+
+
+def load_llamacpp_model(model_path: str = const.GGUF_MODEL_PATH) -> BaseLLM:
+    # Needs the optional llama-cpp-python package, LlamaCpp raises an
+    # ImportError explaining how to install it.
+    from langchain_community.llms import LlamaCpp
+
+    threads = const.llamacpp_threads or os.cpu_count()
+    return LlamaCpp(
+        model_path=model_path,
+        n_ctx=const.llamacpp_context_length,
+        n_batch=const.llamacpp_batch_size,
+        n_threads=threads,
+        n_gpu_layers=0,
+        max_tokens=2048,
+        temperature=const.llm_temperture,
+        repeat_penalty=1.1,
+        streaming=False,
+        verbose=False,
+        model_kwargs={"n_threads_batch": threads},
+    )
+
+
+def stop_token_ids(tokenizer, stop: List[str]) -> List[int]:
+    # The end of text token and the stop sequences that are single tokens.
+    ids = [tokenizer.eos_token_id]
+    for token in stop:
+        token_id = tokenizer.convert_tokens_to_ids(token)
+        if token_id is not None and token_id != tokenizer.unk_token_id:
+            ids.append(token_id)
+    return sorted(set(ids))
+
+
+def load_local_model(
+    backend: str = const.local_llm_backend, model_path: Optional[str] = None
+) -> BaseLLM:
+    if resolve_local_llm_backend(backend) == "llamacpp":
+        return load_llamacpp_model(model_path or const.GGUF_MODEL_PATH)
+
+    import transformers
+    from langchain.llms import HuggingFacePipeline
+
+    model = load_local_causal_lm(model_path or const.MODELS_PATH)
+    tokenizer = load_local_tokenizer(model_path or const.MODELS_PATH)
+    # Batched generation pads the prompts, decoder-only models need them
+    # padded on the left and Llama 3 has no padding token of its own.
+    tokenizer.padding_side = "left"
+    tokenizer.pad_token = tokenizer.eos_token
     text_generation_pipeline = transformers.pipeline(
         model=model,
         tokenizer=tokenizer,
         task="text-generation",
-        eos_token_id=tokenizer.eos_token_id,
+        # HuggingFacePipeline hands the pipeline a list of prompts, which it
+        # would otherwise run one at a time.
+        batch_size=const.llm_max_batch_size,
+        # HuggingFacePipeline ignores stop sequences, generation ends on the
+        # end of turn token as well as the end of text token instead.
+        eos_token_id=stop_token_ids(tokenizer, [const.llama3_stop_token]),
         pad_token_id=tokenizer.eos_token_id,
         repetition_penalty=1.1,
         return_full_text=False,
@@ -50,14 +169,65 @@ def load_local_model() -> BaseLLM:
         temperature=const.llm_temperture,
         do_sample=True,
     )
-    local_llm = HuggingFacePipeline(pipeline=text_generation_pipeline)
+    local_llm = HuggingFacePipeline(
+        pipeline=text_generation_pipeline, batch_size=const.llm_max_batch_size
+    )
     return local_llm
 
 
 def cache_and_load_embedding_model() -> Embeddings:
+    from langchain_community.embeddings.sentence_transformer import (
+        SentenceTransformerEmbeddings,
+    )
+
     embedding = SentenceTransformerEmbeddings(
         model_name=const.embed_model_name,
         cache_folder=const.EMBED_PATH,
         model_kwargs={"trust_remote_code": True},
     )
     return embedding
+
+
+def load_query_embedding_model() -> Embeddings:
+    # Queries must go through the same compression as the stored chunk embeddings.
+    embedding = cache_and_load_embedding_model()
+    if os.path.exists(const.EMBEDDING_COMPRESSOR_PATH):
+        return CompressedEmbeddings(
+            embedding, EmbeddingCompressor.load(const.EMBEDDING_COMPRESSOR_PATH)
+        )
+    return embedding
+
+
+def unwrap_llm(llm: BaseLLM) -> BaseLLM:
+    # The LLM a wrapper such as BatchingLLM generates with.
+    while isinstance(getattr(llm, "llm", None), BaseLLM):
+        llm = llm.llm
+    return llm
+
+
+def count_tokens(llm: BaseLLM, text: str) -> int:
+    # Counted with the tokenizer of the local model, whatever its backend.
+    llm = unwrap_llm(llm)
+    if llm._llm_type == "huggingface_pipeline":
+        return len(llm.pipeline.tokenizer.encode(text, add_special_tokens=False))
+    return llm.get_num_tokens(text)
+
+
+def context_length(llm: BaseLLM) -> Optional[int]:
+    # Context window of a local model, None for remote models.
+    llm = unwrap_llm(llm)
+    if llm._llm_type == "huggingface_pipeline":
+        return llm.pipeline.model.config.max_position_embeddings
+    if llm._llm_type == "llamacpp":
+        return llm.n_ctx
+    return None
+
+
+def max_new_tokens_kwargs(llm: BaseLLM, max_new_tokens: int) -> Dict:
+    # Call time keyword arguments limiting the generated tokens of one call.
+    llm = unwrap_llm(llm)
+    if llm._llm_type == "huggingface_pipeline":
+        return {"pipeline_kwargs": {"max_new_tokens": max_new_tokens}}
+    if llm._llm_type in ["llamacpp", "openai"]:
+        return {"max_tokens": max_new_tokens}
+    return dict()
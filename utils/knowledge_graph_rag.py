@@ -1,6 +1,6 @@
 import logging
 import re
-from typing import List
+from typing import Any, Dict, List
 
 from langchain.graphs import Neo4jGraph
 from langchain.vectorstores.neo4j_vector import Neo4jVector
@@ -10,6 +10,13 @@ from langchain_core.prompts.prompt import PromptTemplate
 import utils.constants as const
 import utils.retriever_utils as ret_utils
 from utils.arxiv_utils import IngestablePaper, PaperChunk
+from utils.context_utils import (
+    ContextPacker,
+    context_token_budget,
+    prompt_token_budget,
+)
+from utils.generation_utils import GenerationController
+from utils.paper_card_utils import get_paper_cards, render_paper_cards
 
 
 class KnowledgeGraphRAG:
@@ -52,13 +59,21 @@ Instruction: Please provide the asked information about the papers in the contex
         llm: BaseLLM,
         top_k: int,
         bos_token: str,
+        search_mode: str = const.chunk_search_mode,
+        adaptive_rerank: bool = const.adaptive_rerank,
+        use_paper_cards: bool = const.use_paper_cards,
     ):
         self.graphDbInstance = graphDbInstance
         self.document_index = document_index
         self.llm = llm
         self.top_k = top_k
         self.bos_token = bos_token
+        self.search_mode = search_mode
+        self.adaptive_rerank = adaptive_rerank
+        self.use_paper_cards = use_paper_cards
         self._used_papers = list()
+        self._context_stats = dict()
+        self.generation = GenerationController(llm)
 
     def retrieve_chunks(self, query: str) -> List[PaperChunk]:
         return ret_utils.hybrid_retreiver(
@@ -66,17 +81,31 @@ Instruction: Please provide the asked information about the papers in the contex
             top_k=self.top_k,
             graphDbInstance=self.graphDbInstance,
             document_index=self.document_index,
+            search_mode=self.search_mode,
+            adaptive_rerank=self.adaptive_rerank,
         )
 
     def generate_context(self, query: str) -> str:
         paper_chunks = self.retrieve_chunks(query)
-        context = ""
-        for chunk in paper_chunks:
-            context += f"Document:{chunk.text}\n"
-            context += f"Document arXiv ID: {chunk.paper.arxiv_id}\n"
-            context += "\n\n"
+        empty_prompt = self.bos_token + self._initial_prompt_template.format(
+            question=query, context=""
+        )
+        packer = ContextPacker(
+            self.llm,
+            context_token_budget(self.llm, empty_prompt, prompt_token_budget(self.llm)),
+        )
+        context = packer.pack(paper_chunks)
+        self._context_stats = packer.stats
         return context
 
+    @property
+    def context_stats(self) -> Dict[str, Any]:
+        return self._context_stats
+
+    @property
+    def generation_stats(self) -> List[Dict[str, Any]]:
+        return self.generation.calls
+
     def get_auxillary_context_from_papers(self, arxiv_ids: List[str]) -> str:
         papers = ret_utils.get_papers(arxiv_ids, self.graphDbInstance)
         context = ""
@@ -105,13 +134,16 @@ Instruction: Please provide the asked information about the papers in the contex
         prompt1 = PromptTemplate.from_template(
             self.bos_token + self._initial_prompt_template
         )
-        chain1 = prompt1 | self.llm
-        response1 = chain1.invoke(
-            {
-                "question": question,
-                "context": context,
-            }
+        inputs = {
+            "question": question,
+            "context": context,
+        }
+        response1 = self.generation.generate(
+            "answer", prompt1.format(**inputs), const.answer_max_new_tokens
         )
+        call = self.generation.last_call
+        self._context_stats["prompt_tokens"] = call["prompt_tokens"]
+        logging.info(f"Context stats: {self._context_stats}")
         arxiv_references = re.findall(r"\d{4}\.\d{4,5}", response1)
         arxiv_ids = [arxiv_id for arxiv_id in arxiv_references]
         arxiv_ids = list(set(arxiv_ids))
@@ -119,17 +151,25 @@ Instruction: Please provide the asked information about the papers in the contex
         return response1
 
     def invoke_followup(self) -> str:
+        if self.use_paper_cards:
+            cards = get_paper_cards(self._used_papers, self.graphDbInstance)
+            # Without a current card for every paper, or without any card at
+            # all, fall back to the LLM for all of them.
+            current = [c for c in cards if c["is_current"]]
+            if cards and len(current) == len(cards):
+                self._used_papers = list()
+                return render_paper_cards(cards)
+            logging.info(f"Current paper cards for {len(current)}/{len(cards)} papers")
         auxillary_context = self.get_auxillary_context_from_papers(self._used_papers)
         logging.debug(f"Auxillary Context: {auxillary_context}")
 
         prompt = PromptTemplate.from_template(
             self.bos_token + self._followup_prompt_template
         )
-        chain = prompt | self.llm
-        response = chain.invoke(
-            {
-                "context": auxillary_context,
-            }
+        response = self.generation.generate(
+            "followup",
+            prompt.format(context=auxillary_context),
+            const.followup_max_new_tokens,
         )
         self._used_papers = list()
         return response
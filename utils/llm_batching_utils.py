@@ -0,0 +1,177 @@
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.outputs import Generation, LLMResult
+
+
+class _Request:
+    def __init__(self, prompt: str, stop: Optional[List[str]], kwargs: Dict):
+        self.prompt = prompt
+        self.stop = stop
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+    @property
+    def key(self) -> Tuple:
+        # Only requests with the same generation settings share a batch.
+        return (
+            tuple(self.stop) if self.stop else None,
+            json.dumps(self.kwargs, sort_keys=True, default=str),
+        )
+
+
+class GenerationScheduler:
+    """
+    Queues prompts from all sessions for one shared LLM and runs them in
+    batches. An idle scheduler waits up to max_wait_seconds for a batch to
+    fill, prompts that queued up while a batch was generating go into the
+    next batch straight away.
+    """
+
+    def __init__(self, llm: BaseLLM, max_batch_size: int, max_wait_seconds: float):
+        self.llm = llm
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._requests = 0
+        self._wait_seconds = 0.0
+        self._generation_seconds = 0.0
+        self._max_queue_depth = 0
+        self._worker = threading.Thread(
+            target=self._run, name="llm-scheduler", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, prompt: str, stop: Optional[List[str]], kwargs: Dict) -> Future:
+        request = _Request(prompt, stop, kwargs)
+        self._queue.put(request)
+        with self._lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return request.future
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        backlog = False
+        while len(batch) < self.max_batch_size:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                return batch
+            batch.append(request)
+            backlog = True
+        if backlog:
+            return batch
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            groups: Dict[Tuple, List[_Request]] = dict()
+            for request in batch:
+                groups.setdefault(request.key, list()).append(request)
+            for requests in groups.values():
+                self._generate(requests)
+
+    def _generate(self, requests: List[_Request]):
+        start = time.perf_counter()
+        try:
+            result = self.llm.generate(
+                [r.prompt for r in requests],
+                stop=requests[0].stop,
+                **requests[0].kwargs,
+            )
+        except Exception as e:
+            for r in requests:
+                r.future.set_exception(e)
+            return
+        with self._lock:
+            self._batch_sizes[len(requests)] += 1
+            self._requests += len(requests)
+            self._wait_seconds += sum(start - r.submitted for r in requests)
+            self._generation_seconds += time.perf_counter() - start
+        for r, generations in zip(requests, result.generations):
+            r.future.set_result(generations)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "batches": batches,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "mean_batch_size": self._requests / batches if batches else 0.0,
+                "mean_wait_ms": (
+                    1000 * self._wait_seconds / self._requests
+                    if self._requests
+                    else 0.0
+                ),
+                "generation_seconds": self._generation_seconds,
+            }
+
+
+class BatchingLLM(BaseLLM):
+    """
+    BaseLLM that hands every prompt to a GenerationScheduler, so that
+    concurrent calls from different sessions are batched on the wrapped LLM.
+    """
+
+    scheduler: GenerationScheduler
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def llm(self) -> BaseLLM:
+        return self.scheduler.llm
+
+    @property
+    def _llm_type(self) -> str:
+        return "batching_" + self.llm._llm_type
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        futures = [self.scheduler.submit(p, stop, kwargs) for p in prompts]
+        generations: List[List[Generation]] = [f.result() for f in futures]
+        return LLMResult(generations=generations)
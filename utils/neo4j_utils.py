@@ -1,10 +1,18 @@
 import os
 import time
+from functools import lru_cache
 
-from kubernetes import client, config
 from neo4j import GraphDatabase
 
-config.load_incluster_config()
+
+@lru_cache(maxsize=None)
+def kube_client():
+    # Importing the Kubernetes client and loading the in-cluster config is only
+    # needed to deploy Neo4j, not to talk to it.
+    from kubernetes import client, config
+
+    config.load_incluster_config()
+    return client
 
 
 def get_current_namespace():
@@ -23,6 +31,7 @@ def get_parent_pod_uid():
 
 
 def get_pvc_name_from_parent_pod() -> str:
+    client = kube_client()
     pod_name = get_parent_pod_name()
     pod_spec = client.CoreV1Api().read_namespaced_pod(
         name=pod_name, namespace=get_current_namespace()
@@ -47,6 +56,7 @@ def get_neo4j_credentails():
 
 
 def get_onwer_reference():
+    client = kube_client()
     parent_pod_name = get_parent_pod_name()
     parent_pod_uid = get_parent_pod_uid()
     return client.V1OwnerReference(
@@ -58,6 +68,7 @@ def get_onwer_reference():
 
 
 def create_deployment_spec_for_neo4j():
+    client = kube_client()
     namespace = get_current_namespace()
     engine_id = get_engine_id()
 
@@ -158,6 +169,7 @@ def get_neo4j_service_name():
 
 
 def create_service_spec_for_neo4j():
+    client = kube_client()
     namespace = get_current_namespace()
     engine_id = get_engine_id()
 
@@ -185,6 +197,7 @@ def create_service_spec_for_neo4j():
 
 
 def deploy_neo4j_server():
+    client = kube_client()
     api_instance = client.AppsV1Api()
     service_api_instance = client.CoreV1Api()
 
@@ -200,6 +213,7 @@ def deploy_neo4j_server():
 
 
 def stop_neo4j_server():
+    client = kube_client()
     api_instance = client.AppsV1Api()
     service_api_instance = client.CoreV1Api()
 
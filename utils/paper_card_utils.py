@@ -0,0 +1,117 @@
+from typing import Dict, Iterator, List
+
+from langchain.graphs import Neo4jGraph
+from langchain_core.language_models.llms import BaseLLM
+
+# A paper card holds everything the follow-up answer shows about a paper. The
+# summary is generated once per paper, the related papers and top authors are
+# recomputed whenever the graph version changes.
+_card_summary_prompt_template = """<|start_header_id|>system<|end_header_id|>
+You are an AI language model designed to summarize research papers in a concise manner.
+Do not add any greetings or salutations. It is very important that you only provide the final output without any additional comments or remarks.
+<|eot_id|><|start_header_id|>user<|end_header_id|>
+Summarize the following paper summary in 2 lines.
+Paper Title: {title}
+Paper Summary: {summary}
+<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+"""
+
+
+def update_paper_card_links(graph: Neo4jGraph, graph_version: str, top_n: int) -> int:
+    result = graph.query(
+        """
+    MATCH (p:Paper)
+    WHERE p.card_graph_version IS NULL OR p.card_graph_version <> $graph_version
+    CALL {
+        WITH p
+        SET
+          p.card_related_papers = COLLECT {
+            MATCH (citing:Paper)-[:CITES]->(p)
+            WITH citing, COUNT { (citing)<-[:CITES]-(:Paper) } AS citations
+            ORDER BY citations DESC LIMIT $top_n
+            RETURN citing.title + "(" + citing.id + ")"
+          },
+          p.card_top_authors = COLLECT {
+            MATCH (p)-[:AUTHORED_BY]->(a:Author)
+            WITH DISTINCT a
+            WITH a, COUNT { (a)<-[:AUTHORED_BY]-(:Paper) } AS papers
+            ORDER BY papers DESC LIMIT $top_n
+            RETURN a.name
+          },
+          p.card_graph_version = $graph_version
+    } IN TRANSACTIONS OF 1000 ROWS
+    RETURN COUNT(p) AS updated
+    """,
+        params={"graph_version": graph_version, "top_n": top_n},
+    )
+    return result[0]["updated"]
+
+
+def get_papers_without_card_summary(graph: Neo4jGraph) -> List[Dict]:
+    return graph.query(
+        """
+    MATCH (p:Paper) WHERE p.card_summary IS NULL
+    RETURN p.id AS id, p.title AS title, p.summary AS summary
+    ORDER BY id
+    """
+    )
+
+
+def summarize_papers(
+    llm: BaseLLM, bos_token: str, papers: List[Dict], batch_size: int
+) -> Iterator[List[Dict]]:
+    for i in range(0, len(papers), batch_size):
+        batch = papers[i : i + batch_size]
+        responses = llm.batch(
+            [
+                bos_token
+                + _card_summary_prompt_template.format(
+                    title=p["title"], summary=p["summary"]
+                )
+                for p in batch
+            ]
+        )
+        yield [
+            {"id": p["id"], "card_summary": r.strip()} for p, r in zip(batch, responses)
+        ]
+
+
+def save_card_summaries(graph: Neo4jGraph, rows: List[Dict]):
+    graph.query(
+        """
+    UNWIND $rows AS row
+    MATCH (p:Paper {id: row.id})
+    SET p.card_summary = row.card_summary
+    """,
+        params={"rows": rows},
+    )
+
+
+def get_paper_cards(arxiv_ids: List[str], graph: Neo4jGraph) -> List[Dict]:
+    # A card is only current if it has a summary and was computed for the
+    # current version of the graph, the related papers and top authors of older
+    # cards may be out of date. Unknown arxiv ids are left out.
+    return graph.query(
+        """
+    OPTIONAL MATCH (m:GraphMetadata {id: "graph"})
+    MATCH (p:Paper) WHERE p.id IN $arxiv_ids
+    RETURN p.id AS id, p.title AS title, p.card_summary AS summary,
+           p.card_related_papers AS related_papers,
+           p.card_top_authors AS top_authors,
+           p.card_summary IS NOT NULL
+             AND coalesce(p.card_graph_version = m.version, false) AS is_current
+    ORDER BY id
+    """,
+        params={"arxiv_ids": arxiv_ids},
+    )
+
+
+def render_paper_cards(cards: List[Dict]) -> str:
+    text = ""
+    for i, card in enumerate(cards):
+        text += f"{i+1}. **Paper Title**: {card['title']} ({card['id']})\n"
+        text += f"   - **Related Papers**: {', '.join(card['related_papers'])}\n"
+        text += f"   - **Top Authors**: {', '.join(card['top_authors'])}\n"
+        text += f"   - **Summary**: {card['summary']}\n"
+        text += "\n"
+    return text
@@ -0,0 +1,179 @@
+import queue
+import resource
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+_END_OF_STREAM = object()
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.items_out / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.items_in} in, {self.items_out} out, "
+            f"{self.elapsed_seconds:.1f}s, {self.throughput:.2f} items/s"
+        )
+
+
+class _Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Iterator[Any]], Iterable[Any]],
+        queue_size: int,
+    ):
+        self.name = name
+        self.fn = fn
+        self.output: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stats = StageStats(name)
+
+
+class StagedPipeline:
+    """
+    Runs a chain of generator stages, each in its own thread, connected by
+    bounded queues. A stage is a function that takes an iterator of inputs and
+    yields outputs, so it may buffer, batch or fan-out as it sees fit. Bounded
+    queues apply back-pressure, so at most `queue_size` items wait between any
+    two stages and the stages overlap in time.
+    """
+
+    def __init__(self, source: Iterable[Any], queue_size: int = 8):
+        self.source = source
+        self.queue_size = queue_size
+        self._stages: List[_Stage] = list()
+        self._errors: List[BaseException] = list()
+        self._cancelled = threading.Event()
+
+    def add_stage(
+        self,
+        name: str,
+        fn: Callable[[Iterator[Any]], Iterable[Any]],
+        queue_size: Optional[int] = None,
+    ) -> "StagedPipeline":
+        self._stages.append(
+            _Stage(name, fn, queue_size if queue_size else self.queue_size)
+        )
+        return self
+
+    @property
+    def stats(self) -> List[StageStats]:
+        return [s.stats for s in self._stages]
+
+    def _put(self, q: queue.Queue, item: Any):
+        while not self._cancelled.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _drain(self, q: queue.Queue, stats: StageStats) -> Iterator[Any]:
+        while not self._cancelled.is_set():
+            try:
+                item = q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _END_OF_STREAM:
+                return
+            stats.items_in += 1
+            yield item
+
+    def _run_stage(self, stage: _Stage, inputs: Iterator[Any]):
+        stage.stats.started_at = time.perf_counter()
+        try:
+            for item in stage.fn(inputs):
+                stage.stats.items_out += 1
+                self._put(stage.output, item)
+                if self._cancelled.is_set():
+                    break
+        except BaseException as e:
+            self._errors.append(e)
+            self._cancelled.set()
+        finally:
+            stage.stats.finished_at = time.perf_counter()
+            # Always unblock the downstream stage, even on failure.
+            self._put(stage.output, _END_OF_STREAM)
+
+    def run(self) -> Iterator[Any]:
+        if not self._stages:
+            yield from self.source
+            return
+
+        def source_iterator() -> Iterator[Any]:
+            for item in self.source:
+                if self._cancelled.is_set():
+                    return
+                self._stages[0].stats.items_in += 1
+                yield item
+
+        threads = list()
+        for i, stage in enumerate(self._stages):
+            if i == 0:
+                inputs = source_iterator()
+            else:
+                previous = self._stages[i - 1]
+                inputs = self._drain(previous.output, stage.stats)
+            t = threading.Thread(
+                target=self._run_stage,
+                args=(stage, inputs),
+                name=f"pipeline-{stage.name}",
+                daemon=True,
+            )
+            threads.append(t)
+            t.start()
+
+        last = self._stages[-1]
+        try:
+            while True:
+                try:
+                    item = last.output.get(timeout=0.5)
+                except queue.Empty:
+                    if self._cancelled.is_set() and not any(
+                        t.is_alive() for t in threads
+                    ):
+                        break
+                    continue
+                if item is _END_OF_STREAM:
+                    break
+                yield item
+        finally:
+            # Stops upstream stages if the consumer exits early.
+            self._cancelled.set()
+            for t in threads:
+                t.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def consume(self) -> int:
+        count = 0
+        for _ in self.run():
+            count += 1
+        return count
+
+    def report(self) -> str:
+        lines = [str(s) for s in self.stats]
+        lines.append(f"Peak memory (RSS): {get_peak_memory_mb():.1f} MiB")
+        return "\n".join(lines)
+
+
+def get_peak_memory_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -1,11 +1,34 @@
-from typing import List
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+from langchain.docstore.document import Document
 from langchain.graphs import Neo4jGraph
 from langchain.vectorstores.neo4j_vector import Neo4jVector
-from ragatouille import RAGPretrainedModel
 
 import utils.constants as const
 from utils.arxiv_utils import IngestablePaper, PaperChunk
+from utils.compression_utils import CompressedEmbeddings
+from utils.data_utils import create_chunk_id
+from utils.fusion_utils import ScoreFusion, centrality_prior, recency_prior
+
+CHUNK_SEARCH_MODES = ["global", "category", "hierarchical"]
+
+# How often category routed searches were answered from the routed categories,
+# and why the others fell back to a global search.
+category_routing_stats: Counter = Counter()
+# How often hierarchical searches found enough chunks in the top papers.
+hierarchical_search_stats: Counter = Counter()
+# How often the adaptive hybrid retriever skipped, shrank or fully ran ColBERT.
+rerank_gate_stats: Counter = Counter()
+
+# The ColBERT model is loaded once per process and shared by all sessions, the
+# lock also serializes reranking on the shared model.
+_colbert_model = None
+_colbert_lock = threading.Lock()
 
 
 def get_papers(
@@ -44,10 +67,206 @@ def get_papers(
     return papers
 
 
+def embed_query_for_search(
+    query: str, document_index: Neo4jVector
+) -> Tuple[List[float], List[float]]:
+    # Category embeddings are never compressed, unlike the chunk embeddings, so
+    # return the full precision query vector alongside the chunk query vector.
+    embedding = document_index.embedding
+    if isinstance(embedding, CompressedEmbeddings):
+        full_vector = embedding.base_embeddings.embed_query(query)
+        return (
+            full_vector,
+            embedding.compressor.transform(np.array(full_vector)).tolist(),
+        )
+    vector = embedding.embed_query(query)
+    return vector, vector
+
+
+def _global_search(
+    document_index: Neo4jVector, query_vector: List[float], top_k: int
+) -> List[Document]:
+    # Every search mode returns its similarity scores in the "score" metadata,
+    # and the chunk id, which Neo4jVector leaves out of the metadata.
+    results = document_index.similarity_search_with_score_by_vector(
+        query_vector, k=top_k
+    )
+    for document, score in results:
+        document.metadata["score"] = score
+        document.metadata["id"] = create_chunk_id(
+            document.metadata["arxiv_id"], document.page_content
+        )
+    return [document for document, _ in results]
+
+
+def get_top_categories(
+    query_vector: List[float], top_n: int, graphDbInstance: Neo4jGraph
+) -> List[Tuple[str, float]]:
+    results = graphDbInstance.query(
+        """
+        CALL db.index.vector.queryNodes('category_embedding_index', $top_n, $embedding)
+        YIELD node, score
+        RETURN node.code AS code, score
+        """,
+        params={"top_n": top_n, "embedding": query_vector},
+    )
+    return [(r["code"], r["score"]) for r in results]
+
+
+def category_routed_search(
+    query: str,
+    top_k: int,
+    graphDbInstance: Neo4jGraph,
+    document_index: Neo4jVector,
+    top_categories: int = const.category_routing_top_categories,
+    min_category_score: float = const.category_routing_min_score,
+    max_candidates: int = const.category_routing_max_candidates,
+) -> List[Document]:
+    start = time.perf_counter()
+    full_vector, chunk_vector = embed_query_for_search(query, document_index)
+    categories = get_top_categories(full_vector, top_categories, graphDbInstance)
+    route: Optional[str] = None
+    if not categories or categories[0][1] < min_category_score:
+        route = "fallback_low_category_score"
+    else:
+        # Exact search over the chunks of papers in the top categories, the
+        # vector index cannot be filtered by graph membership.
+        result = graphDbInstance.query(
+            """
+            MATCH (cat:Category)<-[:BELONGS_TO_CATEGORY]-(:Paper)-[:CONTAINS_TEXT]->(c:Chunk)
+            WHERE cat.code IN $codes
+            WITH DISTINCT c LIMIT $limit
+            WITH collect(c) AS candidates
+            CALL {
+              WITH candidates
+              UNWIND CASE WHEN size(candidates) > $max_candidates THEN [] ELSE candidates END AS c
+              WITH c, vector.similarity.cosine(c.embedding, $embedding) AS score
+              ORDER BY score DESC LIMIT $k
+              RETURN collect({text: c.text, id: c.id, arxiv_id: c.arxiv_id, score: score}) AS chunks
+            }
+            RETURN size(candidates) AS candidate_count, chunks
+            """,
+            params={
+                "codes": [code for code, _ in categories],
+                "limit": max_candidates + 1,
+                "max_candidates": max_candidates,
+                "k": top_k,
+                "embedding": chunk_vector,
+            },
+        )[0]
+        if result["candidate_count"] > max_candidates:
+            route = "fallback_too_many_candidates"
+        elif result["candidate_count"] < top_k:
+            route = "fallback_too_few_candidates"
+        else:
+            route = "routed"
+            documents = [
+                Document(
+                    page_content=c["text"],
+                    metadata={
+                        "id": c["id"],
+                        "arxiv_id": c["arxiv_id"],
+                        "score": c["score"],
+                    },
+                )
+                for c in result["chunks"]
+            ]
+    if route != "routed":
+        documents = _global_search(document_index, chunk_vector, top_k)
+    category_routing_stats[route] += 1
+    logging.info(
+        f"Category routed search ({route}) over {[c for c, _ in categories]} took {1000 * (time.perf_counter() - start):.1f}ms, routing stats: {dict(category_routing_stats)}"
+    )
+    return documents
+
+
+def hierarchical_search(
+    query: str,
+    top_k: int,
+    graphDbInstance: Neo4jGraph,
+    document_index: Neo4jVector,
+    top_papers: int = const.hierarchical_top_papers,
+) -> List[Document]:
+    start = time.perf_counter()
+    full_vector, chunk_vector = embed_query_for_search(query, document_index)
+    # Stage one finds the papers closest to the query by title and summary,
+    # stage two ranks only the chunks of those papers.
+    chunks = graphDbInstance.query(
+        """
+        CALL db.index.vector.queryNodes('paper_embedding_index', $top_papers, $paper_embedding)
+        YIELD node AS p
+        MATCH (p)-[:CONTAINS_TEXT]->(c:Chunk)
+        WITH DISTINCT c
+        WITH c, vector.similarity.cosine(c.embedding, $embedding) AS score
+        ORDER BY score DESC LIMIT $k
+        RETURN c.text AS text, c.id AS id, c.arxiv_id AS arxiv_id, score
+        """,
+        params={
+            "top_papers": top_papers,
+            "paper_embedding": full_vector,
+            "k": top_k,
+            "embedding": chunk_vector,
+        },
+    )
+    if len(chunks) < top_k:
+        route = "fallback_too_few_chunks"
+        documents = _global_search(document_index, chunk_vector, top_k)
+    else:
+        route = "hierarchical"
+        documents = [
+            Document(
+                page_content=c["text"],
+                metadata={
+                    "id": c["id"],
+                    "arxiv_id": c["arxiv_id"],
+                    "score": c["score"],
+                },
+            )
+            for c in chunks
+        ]
+    hierarchical_search_stats[route] += 1
+    logging.info(
+        f"Hierarchical search ({route}) over {top_papers} papers took {1000 * (time.perf_counter() - start):.1f}ms, stats: {dict(hierarchical_search_stats)}"
+    )
+    return documents
+
+
+def search_chunks(
+    query: str,
+    top_k: int,
+    graphDbInstance: Neo4jGraph,
+    document_index: Neo4jVector,
+    search_mode: str = "global",
+) -> List[Document]:
+    if search_mode == "category":
+        return category_routed_search(
+            query=query,
+            top_k=top_k,
+            graphDbInstance=graphDbInstance,
+            document_index=document_index,
+        )
+    if search_mode == "hierarchical":
+        return hierarchical_search(
+            query=query,
+            top_k=top_k,
+            graphDbInstance=graphDbInstance,
+            document_index=document_index,
+        )
+    return _global_search(
+        document_index, document_index.embedding.embed_query(query), top_k
+    )
+
+
 def vanilla_retreiver(
-    query: str, top_k: int, graphDbInstance: Neo4jGraph, document_index: Neo4jVector
+    query: str,
+    top_k: int,
+    graphDbInstance: Neo4jGraph,
+    document_index: Neo4jVector,
+    search_mode: str = "global",
 ) -> List[PaperChunk]:
-    retrieved_chunks = document_index.similarity_search(query=query, k=top_k)
+    retrieved_chunks = search_chunks(
+        query, top_k, graphDbInstance, document_index, search_mode
+    )
     return [
         PaperChunk(
             text=c.page_content,
@@ -59,56 +278,199 @@ def vanilla_retreiver(
     ]
 
 
-def colbert_based_retreiver(
-    query: str, top_k: int, graphDbInstance: Neo4jGraph, document_index: Neo4jVector
+def get_colbert_model():
+    global _colbert_model
+    with _colbert_lock:
+        if _colbert_model is None:
+            # ragatouille pulls in torch and ColBERT, only import it once it is used.
+            from ragatouille import RAGPretrainedModel
+
+            _colbert_model = RAGPretrainedModel.from_pretrained(const.colbert_model)
+        return _colbert_model
+
+
+def rerank_with_colbert(
+    query: str,
+    retrieved_chunks: List[Document],
+    top_k: int,
+    papers: Dict[str, IngestablePaper],
 ) -> List[PaperChunk]:
-    RAG = RAGPretrainedModel.from_pretrained(const.colbert_model)
-    retrieved_chunks = document_index.similarity_search(query=query, k=2 * top_k)
-    reranked_results = RAG.rerank(
-        query=query, documents=[c.page_content for c in retrieved_chunks], k=top_k
-    )
+    RAG = get_colbert_model()
+    with _colbert_lock:
+        reranked_results = RAG.rerank(
+            query=query, documents=[c.page_content for c in retrieved_chunks], k=top_k
+        )
     results = list()
     for r in reranked_results:
-        retrieved_chunk = [
-            c for c in retrieved_chunks if c.page_content == r["content"]
-        ][0]
+        retrieved_chunk = retrieved_chunks[r["result_index"]]
         chunk = PaperChunk(
             text=r["content"],
-            paper=get_papers(
-                arxiv_ids=retrieved_chunk.metadata["arxiv_id"],
-                graphDbInstance=graphDbInstance,
-            )[0],
+            paper=papers[retrieved_chunk.metadata["arxiv_id"]],
         )
-        chunk.metadata = {"colbert_score": r["score"], "colbert_rank": r["rank"]}
+        chunk.metadata = {
+            "id": retrieved_chunk.metadata["id"],
+            "colbert_score": r["score"],
+            "colbert_rank": r["rank"],
+        }
         results.append(chunk)
     return results
 
 
+def get_papers_of_chunks(
+    chunks: List[Document], graphDbInstance: Neo4jGraph
+) -> Dict[str, IngestablePaper]:
+    arxiv_ids = list({c.metadata["arxiv_id"] for c in chunks})
+    return {p.arxiv_id: p for p in get_papers(arxiv_ids, graphDbInstance)}
+
+
+def colbert_based_retreiver(
+    query: str,
+    top_k: int,
+    graphDbInstance: Neo4jGraph,
+    document_index: Neo4jVector,
+    search_mode: str = "global",
+) -> List[PaperChunk]:
+    retrieved_chunks = search_chunks(
+        query, 2 * top_k, graphDbInstance, document_index, search_mode
+    )
+    return rerank_with_colbert(
+        query,
+        retrieved_chunks,
+        top_k,
+        get_papers_of_chunks(retrieved_chunks, graphDbInstance),
+    )
+
+
+def get_hybrid_fusion() -> ScoreFusion:
+    return ScoreFusion(
+        weights=const.hybrid_fusion_weights,
+        method=const.hybrid_fusion_method,
+        rrf_k=const.hybrid_rrf_k,
+    )
+
+
+def fusion_signals(
+    chunks: List[PaperChunk], relevance_key: str
+) -> Dict[str, np.ndarray]:
+    citation_counts = np.array([c.paper.citation_count for c in chunks])
+    return {
+        "relevance": np.array([c.metadata[relevance_key] for c in chunks]),
+        "citations": citation_counts,
+        "centrality": centrality_prior(citation_counts),
+        "recency": recency_prior(
+            [c.paper.published_date for c in chunks],
+            half_life_days=const.recency_half_life_days,
+        ),
+    }
+
+
+def rank_by_hybrid_score(
+    chunks: List[PaperChunk],
+    relevance_key: str,
+    top_k: int,
+    fusion: Optional[ScoreFusion] = None,
+) -> List[PaperChunk]:
+    if not chunks:
+        return list()
+    fusion = fusion or get_hybrid_fusion()
+    indices, scores = fusion.top_k(
+        np.arange(len(chunks)), fusion_signals(chunks, relevance_key), top_k
+    )
+    results = list()
+    for i, score in zip(indices, scores):
+        chunks[i].metadata["hybrid_score"] = float(score)
+        results.append(chunks[i])
+    return results
+
+
+def choose_rerank_path(
+    vector_scores: np.ndarray,
+    citation_counts: np.ndarray,
+    top_k: int,
+    vector_score_weight: float,
+    citation_count_weight: float,
+) -> str:
+    # Reranking cannot change which chunks make the cut when the vector scores
+    # drop clearly after rank k and the citation prior picks the same top k.
+    if len(vector_scores) <= top_k:
+        return "skip"
+    order = np.argsort(-vector_scores)
+    margin = vector_scores[order[top_k - 1]] - vector_scores[order[top_k]]
+    prior_scores = vector_score_weight * vector_scores / max(
+        vector_scores.max(), 1e-12
+    ) + citation_count_weight * citation_counts / max(citation_counts.max(), 1)
+    prior_top_k = np.argsort(-prior_scores)[:top_k]
+    agreement = len(set(order[:top_k]) & set(prior_top_k)) / top_k
+    if margin >= const.rerank_skip_margin and agreement >= const.rerank_skip_agreement:
+        return "skip"
+    if margin >= const.rerank_shrink_margin:
+        return "shrink"
+    return "full"
+
+
+def adaptive_hybrid_retreiver(
+    query: str,
+    top_k: int,
+    graphDbInstance: Neo4jGraph,
+    document_index: Neo4jVector,
+    search_mode: str = "global",
+) -> List[PaperChunk]:
+    fusion = get_hybrid_fusion()
+    candidates = search_chunks(
+        query, 4 * top_k, graphDbInstance, document_index, search_mode
+    )
+    papers = get_papers_of_chunks(candidates, graphDbInstance)
+    vector_scores = np.array([c.metadata["score"] for c in candidates])
+    path = choose_rerank_path(
+        vector_scores,
+        np.array([papers[c.metadata["arxiv_id"]].citation_count for c in candidates]),
+        top_k,
+        fusion.weights.get("relevance", 0.0),
+        fusion.weights.get("citations", 0.0),
+    )
+    rerank_gate_stats[path] += 1
+    logging.info(f"Rerank path: {path}, stats: {dict(rerank_gate_stats)}")
+    if path == "skip":
+        # Same 2 * top_k pool ColBERT would keep, scored by vector similarity.
+        results = list()
+        for i in np.argsort(-vector_scores)[: 2 * top_k]:
+            chunk = PaperChunk(
+                text=candidates[i].page_content,
+                paper=papers[candidates[i].metadata["arxiv_id"]],
+            )
+            chunk.metadata = {
+                "id": candidates[i].metadata["id"],
+                "vector_score": float(vector_scores[i]),
+            }
+            results.append(chunk)
+        relevance_key = "vector_score"
+    else:
+        # Shrinking keeps only the vector top 2 * top_k, ColBERT reorders them.
+        pool = candidates[: 2 * top_k] if path == "shrink" else candidates
+        results = rerank_with_colbert(query, pool, 2 * top_k, papers)
+        relevance_key = "colbert_score"
+    for c in results:
+        c.metadata["rerank_path"] = path
+    return rank_by_hybrid_score(results, relevance_key, top_k, fusion)
+
+
 def hybrid_retreiver(
-    query: str, top_k: int, graphDbInstance: Neo4jGraph, document_index: Neo4jVector
+    query: str,
+    top_k: int,
+    graphDbInstance: Neo4jGraph,
+    document_index: Neo4jVector,
+    search_mode: str = "global",
+    adaptive_rerank: bool = False,
 ) -> List[PaperChunk]:
-    colbert_score_weight, citation_count_weight = 0.33, 0.66
+    if adaptive_rerank:
+        return adaptive_hybrid_retreiver(
+            query, top_k, graphDbInstance, document_index, search_mode
+        )
     colbert_results = colbert_based_retreiver(
         query=query,
         top_k=2 * top_k,
         graphDbInstance=graphDbInstance,
         document_index=document_index,
+        search_mode=search_mode,
     )
-    max_colbert_score = max([c.metadata["colbert_score"] for c in colbert_results])
-    max_citation_count = max([c.paper.citation_count for c in colbert_results])
-
-    for c in colbert_results:
-        c.metadata.update(
-            {
-                "hybrid_score": (
-                    colbert_score_weight
-                    * c.metadata["colbert_score"]
-                    / max_colbert_score
-                )
-                + (citation_count_weight * c.paper.citation_count / max_citation_count)
-            }
-        )
-
-    return sorted(
-        colbert_results, key=lambda x: x.metadata["hybrid_score"], reverse=True
-    )[:top_k]
+    return rank_by_hybrid_score(colbert_results, "colbert_score", top_k)
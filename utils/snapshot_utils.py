@@ -0,0 +1,409 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from langchain.docstore.document import Document
+from neo4j import GraphDatabase
+
+from utils.data_utils import ChunkBulkWriter, create_graph_version
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_MANIFEST = "manifest.json"
+CHUNK_EMBEDDINGS_FILE = "chunk_embeddings.npy"
+COMPRESSOR_FILE = "embedding_compressor.npz"
+
+# File name -> (parquet schema, export query). Every query returns the
+# columns of its schema, chunk embeddings go to CHUNK_EMBEDDINGS_FILE in the
+# row order of chunks.parquet.
+SNAPSHOT_TABLES = {
+    "categories.parquet": (
+        pa.schema(
+            [
+                ("code", pa.string()),
+                ("title", pa.string()),
+                ("description", pa.string()),
+                ("embedding", pa.list_(pa.float32())),
+            ]
+        ),
+        """
+        MATCH (c:Category)
+        RETURN c.code AS code, c.title AS title, c.description AS description,
+               c.embedding AS embedding
+        ORDER BY code
+        """,
+    ),
+    "authors.parquet": (
+        pa.schema([("name", pa.string())]),
+        "MATCH (a:Author) RETURN a.name AS name ORDER BY name",
+    ),
+    "papers.parquet": (
+        pa.schema(
+            [
+                ("id", pa.string()),
+                ("title", pa.string()),
+                ("summary", pa.string()),
+                ("published", pa.string()),
+                ("arxiv_link", pa.string()),
+                ("pdf_link", pa.string()),
+                ("cited_arxiv_papers", pa.list_(pa.string())),
+                ("embedding", pa.list_(pa.float32())),
+                ("card_summary", pa.string()),
+                ("card_related_papers", pa.list_(pa.string())),
+                ("card_top_authors", pa.list_(pa.string())),
+                ("card_graph_version", pa.string()),
+            ]
+        ),
+        """
+        MATCH (p:Paper)
+        RETURN p.id AS id, p.title AS title, p.summary AS summary,
+               toString(p.published) AS published, p.arxiv_link AS arxiv_link,
+               p.pdf_link AS pdf_link, p.cited_arxiv_papers AS cited_arxiv_papers,
+               p.embedding AS embedding, p.card_summary AS card_summary,
+               p.card_related_papers AS card_related_papers,
+               p.card_top_authors AS card_top_authors,
+               p.card_graph_version AS card_graph_version
+        ORDER BY id
+        """,
+    ),
+    "chunks.parquet": (
+        pa.schema(
+            [("id", pa.string()), ("text", pa.string()), ("arxiv_id", pa.string())]
+        ),
+        """
+        MATCH (c:Chunk) WHERE c.embedding IS NOT NULL
+        RETURN c.id AS id, c.text AS text, c.arxiv_id AS arxiv_id,
+               c.embedding AS embedding
+        ORDER BY id
+        """,
+    ),
+    "cites.parquet": (
+        pa.schema([("citing", pa.string()), ("cited", pa.string())]),
+        "MATCH (a:Paper)-[:CITES]->(b:Paper) RETURN a.id AS citing, b.id AS cited",
+    ),
+    "authored_by.parquet": (
+        pa.schema([("paper_id", pa.string()), ("author", pa.string())]),
+        "MATCH (p:Paper)-[:AUTHORED_BY]->(a:Author) RETURN p.id AS paper_id, a.name AS author",
+    ),
+    "belongs_to_category.parquet": (
+        pa.schema([("paper_id", pa.string()), ("category", pa.string())]),
+        """
+        MATCH (p:Paper)-[:BELONGS_TO_CATEGORY]->(c:Category)
+        RETURN p.id AS paper_id, c.code AS category
+        """,
+    ),
+    "contains_text.parquet": (
+        pa.schema([("paper_id", pa.string()), ("chunk_id", pa.string())]),
+        """
+        MATCH (p:Paper)-[:CONTAINS_TEXT]->(c:Chunk) WHERE c.embedding IS NOT NULL
+        RETURN p.id AS paper_id, c.id AS chunk_id
+        """,
+    ),
+}
+
+_restore_queries = {
+    "categories.parquet": r"""
+    UNWIND $rows AS row
+    MERGE (c:Category {code: row.code})
+    SET c.title = row.title, c.description = row.description
+    WITH c, row WHERE row.embedding IS NOT NULL
+    CALL db.create.setNodeVectorProperty(c, 'embedding', row.embedding)
+    RETURN COUNT(*) AS written
+    """,
+    "authors.parquet": r"""
+    UNWIND $rows AS row
+    MERGE (a:Author {name: row.name})
+    RETURN COUNT(*) AS written
+    """,
+    "papers.parquet": r"""
+    UNWIND $rows AS row
+    MERGE (p:Paper {id: row.id})
+    SET
+      p.title = row.title,
+      p.summary = row.summary,
+      p.published = date(row.published),
+      p.arxiv_link = row.arxiv_link,
+      p.pdf_link = row.pdf_link,
+      p.cited_arxiv_papers = row.cited_arxiv_papers,
+      p.card_summary = row.card_summary,
+      p.card_related_papers = row.card_related_papers,
+      p.card_top_authors = row.card_top_authors,
+      p.card_graph_version = row.card_graph_version
+    WITH p, row WHERE row.embedding IS NOT NULL
+    CALL db.create.setNodeVectorProperty(p, 'embedding', row.embedding)
+    RETURN COUNT(*) AS written
+    """,
+    "cites.parquet": r"""
+    UNWIND $rows AS row
+    MATCH (a:Paper {id: row.citing}), (b:Paper {id: row.cited})
+    MERGE (a)-[:CITES]->(b)
+    RETURN COUNT(*) AS written
+    """,
+    "authored_by.parquet": r"""
+    UNWIND $rows AS row
+    MATCH (p:Paper {id: row.paper_id}), (a:Author {name: row.author})
+    MERGE (p)-[:AUTHORED_BY]->(a)
+    RETURN COUNT(*) AS written
+    """,
+    "belongs_to_category.parquet": r"""
+    UNWIND $rows AS row
+    MATCH (p:Paper {id: row.paper_id}), (c:Category {code: row.category})
+    MERGE (p)-[:BELONGS_TO_CATEGORY]->(c)
+    RETURN COUNT(*) AS written
+    """,
+    "contains_text.parquet": r"""
+    UNWIND $rows AS row
+    MATCH (p:Paper {id: row.paper_id}), (c:Chunk {id: row.chunk_id})
+    MERGE (p)-[:CONTAINS_TEXT]->(c)
+    RETURN COUNT(*) AS written
+    """,
+}
+
+# Lookup indexes the restore queries MATCH and MERGE on. All other indexes,
+# including the vector indexes, are created once the data is loaded.
+RESTORE_LOOKUP_INDEX_QUERIES = [
+    "CREATE CONSTRAINT category_code_unique IF NOT EXISTS FOR (c:Category) REQUIRE c.code IS UNIQUE",
+    "CREATE CONSTRAINT author_name_unique IF NOT EXISTS FOR (a:Author) REQUIRE a.name IS UNIQUE",
+    "CREATE CONSTRAINT paper_id_unique IF NOT EXISTS FOR (p:Paper) REQUIRE p.id IS UNIQUE",
+    "CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE",
+]
+
+
+def load_snapshot_manifest(directory: str) -> Dict:
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST), "r") as f:
+        manifest = json.load(f)
+    if manifest["format_version"] != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot format {manifest['format_version']}, expected {SNAPSHOT_FORMAT_VERSION}"
+        )
+    return manifest
+
+
+def _read_batches(path: str, batch_size: int) -> Iterator[List[Dict]]:
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield batch.to_pylist()
+
+
+class GraphSnapshot:
+    """
+    Local copy of a built knowledge graph: one Parquet file per node label and
+    relationship type, the chunk embeddings as a float32 .npy matrix and a
+    manifest with the embedding model and graph version. Restoring a snapshot
+    into an empty Neo4j takes no network access and no re-embedding.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        username: str,
+        password: str,
+        database: str = "neo4j",
+        batch_size: int = 5000,
+    ):
+        self.uri = uri
+        self.username = username
+        self.password = password
+        self.database = database
+        self.batch_size = batch_size
+        self._driver = GraphDatabase.driver(uri, auth=(username, password))
+
+    def __enter__(self) -> "GraphSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._driver.close()
+
+    def _graph_metadata(self) -> Optional[Dict]:
+        records, _, _ = self._driver.execute_query(
+            'MATCH (m:GraphMetadata {id: "graph"}) RETURN m.version AS version, m.embedding_model AS embedding_model',
+            database_=self.database,
+        )
+        return records[0].data() if records else None
+
+    def _export_table(self, directory: str, file_name: str) -> int:
+        schema, query = SNAPSHOT_TABLES[file_name]
+        embeddings: Optional[np.ndarray] = None
+        if file_name == "chunks.parquet":
+            records, _, _ = self._driver.execute_query(
+                "MATCH (c:Chunk) WHERE c.embedding IS NOT NULL RETURN COUNT(c) AS count",
+                database_=self.database,
+            )
+            count = records[0]["count"]
+            records, _, _ = self._driver.execute_query(
+                """
+                MATCH (c:Chunk) WHERE c.embedding IS NOT NULL
+                RETURN size(c.embedding) AS dimension LIMIT 1
+                """,
+                database_=self.database,
+            )
+            dimension = records[0]["dimension"] if records else 0
+            embeddings = np.lib.format.open_memmap(
+                os.path.join(directory, CHUNK_EMBEDDINGS_FILE),
+                mode="w+",
+                dtype=np.float32,
+                shape=(count, dimension),
+            )
+        rows = 0
+        with self._driver.session(database=self.database) as session, pq.ParquetWriter(
+            os.path.join(directory, file_name), schema
+        ) as writer:
+            batch = list()
+            for record in session.run(query):
+                row = record.data()
+                if embeddings is not None:
+                    if rows + len(batch) >= len(embeddings):
+                        # Chunks written after the count query are left out.
+                        break
+                    embeddings[rows + len(batch)] = row.pop("embedding")
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    rows += len(batch)
+                    batch = list()
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                rows += len(batch)
+        if embeddings is not None:
+            embeddings.flush()
+        return rows
+
+    def export(
+        self,
+        directory: str,
+        embedding_model: str,
+        compressor_path: Optional[str] = None,
+    ) -> Dict:
+        os.makedirs(directory, exist_ok=True)
+        metadata = self._graph_metadata()
+        counts = dict()
+        for file_name in SNAPSHOT_TABLES:
+            start = time.perf_counter()
+            counts[file_name] = self._export_table(directory, file_name)
+            print(
+                f"Exported {counts[file_name]} rows to {file_name} in {time.perf_counter() - start:.1f}s"
+            )
+        has_compressor = compressor_path is not None and os.path.exists(compressor_path)
+        if has_compressor:
+            shutil.copyfile(compressor_path, os.path.join(directory, COMPRESSOR_FILE))
+        chunk_embeddings = np.load(
+            os.path.join(directory, CHUNK_EMBEDDINGS_FILE), mmap_mode="r"
+        )
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            # A graph exported before it was stamped gets a fresh version, the
+            # restored copy keeps the version of the graph it was taken from.
+            "graph_version": (metadata or {}).get("version") or create_graph_version(),
+            "embedding_model": embedding_model,
+            "chunk_embedding_dimension": int(chunk_embeddings.shape[1]),
+            "embedding_compressor": COMPRESSOR_FILE if has_compressor else None,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "counts": counts,
+        }
+        with open(os.path.join(directory, SNAPSHOT_MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def is_graph_empty(self) -> bool:
+        records, _, _ = self._driver.execute_query(
+            "MATCH (n) RETURN COUNT(n) > 0 AS has_nodes", database_=self.database
+        )
+        return not records[0]["has_nodes"]
+
+    def _restore_table(self, directory: str, file_name: str) -> int:
+        written = 0
+        with self._driver.session(database=self.database) as session:
+            for rows in _read_batches(
+                os.path.join(directory, file_name), self.batch_size
+            ):
+                written += session.execute_write(
+                    lambda tx: tx.run(_restore_queries[file_name], rows=rows).single()[
+                        "written"
+                    ]
+                )
+        return written
+
+    def _restore_chunks(self, directory: str, rows_per_transaction: int) -> int:
+        embeddings = np.load(
+            os.path.join(directory, CHUNK_EMBEDDINGS_FILE), mmap_mode="r"
+        )
+        offset = 0
+        with ChunkBulkWriter(
+            uri=self.uri,
+            username=self.username,
+            password=self.password,
+            database=self.database,
+            rows_per_transaction=rows_per_transaction,
+        ) as writer:
+            for rows in _read_batches(
+                os.path.join(directory, "chunks.parquet"), self.batch_size
+            ):
+                vectors = embeddings[offset : offset + len(rows)].tolist()
+                offset += len(rows)
+                writer.write(
+                    [
+                        (
+                            Document(
+                                page_content=r["text"],
+                                metadata={"arxiv_id": r["arxiv_id"]},
+                            ),
+                            v,
+                        )
+                        for r, v in zip(rows, vectors)
+                    ]
+                )
+            writer.flush()
+            if writer.failed_count or writer.unmatched_count:
+                print(
+                    f"Failed to restore {writer.failed_count + writer.unmatched_count} chunks"
+                )
+            return writer.written_count
+
+    def restore(
+        self,
+        directory: str,
+        compressor_path: Optional[str] = None,
+        rows_per_transaction: int = 500,
+    ) -> Dict:
+        manifest = load_snapshot_manifest(directory)
+        for q in RESTORE_LOOKUP_INDEX_QUERIES:
+            self._driver.execute_query(q, database_=self.database)
+        # Nodes before the relationships that MATCH them, chunks go through the
+        # same writer as the build job and link themselves to their paper.
+        for file_name in [
+            "categories.parquet",
+            "authors.parquet",
+            "papers.parquet",
+            "chunks.parquet",
+            "cites.parquet",
+            "authored_by.parquet",
+            "belongs_to_category.parquet",
+            "contains_text.parquet",
+        ]:
+            start = time.perf_counter()
+            if file_name == "chunks.parquet":
+                written = self._restore_chunks(directory, rows_per_transaction)
+            else:
+                written = self._restore_table(directory, file_name)
+            print(
+                f"Restored {written}/{manifest['counts'][file_name]} rows from {file_name} in {time.perf_counter() - start:.1f}s"
+            )
+        # Query embeddings have to go through the compressor the stored chunk
+        # embeddings were produced with, or through none at all.
+        if compressor_path:
+            if manifest["embedding_compressor"]:
+                os.makedirs(os.path.dirname(compressor_path) or ".", exist_ok=True)
+                shutil.copyfile(
+                    os.path.join(directory, manifest["embedding_compressor"]),
+                    compressor_path,
+                )
+            elif os.path.exists(compressor_path):
+                os.remove(compressor_path)
+        return manifest
@@ -1,5 +1,5 @@
 import logging
-from typing import List
+from typing import Any, Dict, List
 
 from langchain.graphs import Neo4jGraph
 from langchain.vectorstores.neo4j_vector import Neo4jVector
@@ -9,6 +9,12 @@ from langchain_core.prompts.prompt import PromptTemplate
 import utils.constants as const
 import utils.retriever_utils as ret_utils
 from utils.arxiv_utils import IngestablePaper, PaperChunk
+from utils.context_utils import (
+    ContextPacker,
+    context_token_budget,
+    prompt_token_budget,
+)
+from utils.generation_utils import GenerationController
 
 
 class VanillaRAG:
@@ -35,12 +41,16 @@ Try to combine information from multiple documents to answer the question.
         llm: BaseLLM,
         top_k: int,
         bos_token: str,
+        search_mode: str = const.chunk_search_mode,
     ):
         self.graphDbInstance = graphDbInstance
         self.document_index = document_index
         self.llm = llm
         self.top_k = top_k
         self.bos_token = bos_token
+        self.search_mode = search_mode
+        self._context_stats = dict()
+        self.generation = GenerationController(llm)
 
     def retrieve_chunks(self, query: str) -> List[PaperChunk]:
         return ret_utils.vanilla_retreiver(
@@ -48,26 +58,42 @@ Try to combine information from multiple documents to answer the question.
             top_k=self.top_k,
             graphDbInstance=self.graphDbInstance,
             document_index=self.document_index,
+            search_mode=self.search_mode,
         )
 
     def generate_context(self, query: str) -> str:
         paper_chunks = self.retrieve_chunks(query)
-        context = ""
-        for chunk in paper_chunks:
-            context += f"Document:{chunk.text}\n"
-            context += f"Document arXiv ID: {chunk.paper.arxiv_id}\n"
-            context += "\n\n"
+        empty_prompt = self.bos_token + self._prompt_template.format(
+            question=query, context=""
+        )
+        packer = ContextPacker(
+            self.llm,
+            context_token_budget(self.llm, empty_prompt, prompt_token_budget(self.llm)),
+        )
+        context = packer.pack(paper_chunks)
+        self._context_stats = packer.stats
         return context
 
+    @property
+    def context_stats(self) -> Dict[str, Any]:
+        return self._context_stats
+
+    @property
+    def generation_stats(self) -> List[Dict[str, Any]]:
+        return self.generation.calls
+
     def invoke(self, question: str) -> str:
         context = self.generate_context(question)
         logging.debug(f"Context: {context}")
         prompt1 = PromptTemplate.from_template(self.bos_token + self._prompt_template)
-        chain1 = prompt1 | self.llm
-        response1 = chain1.invoke(
-            {
-                "question": question,
-                "context": context,
-            }
+        inputs = {
+            "question": question,
+            "context": context,
+        }
+        response1 = self.generation.generate(
+            "answer", prompt1.format(**inputs), const.answer_max_new_tokens
         )
+        call = self.generation.last_call
+        self._context_stats["prompt_tokens"] = call["prompt_tokens"]
+        logging.info(f"Context stats: {self._context_stats}")
         return response1
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _Component:
+    def __init__(self, load: Callable[[], Any], probe: Optional[Callable[[Any], Any]]):
+        self.load = load
+        self.probe = probe
+        self.state = "pending"
+        self.resource = None
+        self.error: Optional[Exception] = None
+        self.load_seconds: Optional[float] = None
+        self.probe_seconds: Optional[float] = None
+        self.done = threading.Event()
+
+
+class WarmupService:
+    """
+    Loads resources concurrently in background threads, runs one dummy query
+    through each and keeps their readiness state, so that pages can show it
+    instead of blocking on the loads. Components that are not started up
+    front are loaded on their first get.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, _Component] = dict()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def add(
+        self,
+        name: str,
+        load: Callable[[], Any],
+        probe: Optional[Callable[[Any], Any]] = None,
+    ) -> "WarmupService":
+        self._components[name] = _Component(load, probe)
+        return self
+
+    def start(self, names: Optional[List[str]] = None) -> "WarmupService":
+        for name in self._components if names is None else names:
+            self._start(name)
+        return self
+
+    def _start(self, name: str):
+        component = self._components[name]
+        with self._lock:
+            if component.state != "pending":
+                return
+            component.state = "loading"
+        threading.Thread(
+            target=self._warm_up, args=(name,), name=f"warmup-{name}", daemon=True
+        ).start()
+
+    def _warm_up(self, name: str):
+        component = self._components[name]
+        try:
+            start = time.perf_counter()
+            component.resource = component.load()
+            component.load_seconds = time.perf_counter() - start
+            if component.probe is not None:
+                start = time.perf_counter()
+                component.probe(component.resource)
+                component.probe_seconds = time.perf_counter() - start
+            component.state = "ready"
+            logging.info(
+                f"Warmed up {name} in {component.load_seconds:.1f}s, probe {component.probe_seconds or 0:.2f}s"
+            )
+        except Exception as e:
+            component.error = e
+            component.state = "failed"
+            logging.error(f"Failed to warm up {name}: {e}")
+        finally:
+            component.done.set()
+
+    def get(self, name: str, timeout: Optional[float] = None) -> Any:
+        self._start(name)
+        component = self._components[name]
+        if not component.done.wait(timeout):
+            raise TimeoutError(f"{name} is not warmed up after {timeout}s")
+        if component.error is not None:
+            raise component.error
+        return component.resource
+
+    def is_ready(self, name: Optional[str] = None) -> bool:
+        # Without a name, whether every started component is ready.
+        names = (
+            [name]
+            if name
+            else [n for n, c in self._components.items() if c.state != "pending"]
+        )
+        return all(
+            n in self._components and self._components[n].state == "ready"
+            for n in names
+        )
+
+    def status(self) -> Dict[str, Dict]:
+        # Readiness probe: state and warm-up time of every component.
+        return {
+            name: {
+                "state": c.state,
+                "load_seconds": c.load_seconds,
+                "probe_seconds": c.probe_seconds,
+                "error": str(c.error) if c.error else None,
+            }
+            for name, c in self._components.items()
+        }
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self._started